@@ -0,0 +1,324 @@
+"""
+End-to-end acquisition benchmark of sweep_lsl.py with stored baselines
+
+Runs the real recording path (ChunkPuller acquisition thread -> ring buffer
+-> record_to_csv -> AsyncRecordingWriter -> CSV/binary sink) against
+synthetic_eeg_source.py for
+a grid of sample rates, channel counts and output formats. Every case runs
+in a fresh process, so CPU time and peak RSS belong to that case only; the
+source runs in its own process and is not counted.
+
+Per case: sustained samples/s, recorder CPU %, peak RSS, pull latency
+(local_clock() when a chunk enters the ring buffer minus its newest sample's
+timestamp) and samples lost (gaps in the nominal-rate timestamps).
+
+Results are written as JSON. With --baseline they are compared against a
+previous result file and regressions are flagged (exit code 1).
+
+The recorder keeps at most EEG_CHANNELS_COUNT (33) channels of a stream;
+each case reports the channel count actually recorded.
+
+Usage: python bench_acquisition.py [-r 2000 10000 20000] [-c 8 33] [-f csv binary]
+                                   [-s 20] [-o bench_results.json] [-b bench_baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pylsl import StreamInlet, local_clock, resolve_byprop
+
+from sweep_lsl import (
+    EEG_CHANNELS_COUNT,
+    RECORDING_FORMATS,
+    ChunkPuller,
+    open_recording,
+    record_to_csv,
+)
+
+try:
+    import resource  # Not available on Windows: peak RSS is then not reported
+except ImportError:
+    resource = None
+
+BENCH_SOURCE_NAME: str = "SweepAcquisitionBench"
+WARMUP_SEC: float = 1.0
+DEFAULT_TOLERANCE: float = 0.10
+# Absolute slack under which a relative increase is not flagged (noise floor)
+CPU_SLACK_PERCENT: float = 2.0
+LATENCY_SLACK_MS: float = 1.0
+
+CaseKey = Tuple[int, int, str]
+
+
+class MeasuringPuller(ChunkPuller):
+    """ChunkPuller that records pull latency and timestamp gaps of its acquisition thread."""
+
+    def __init__(self, inlet: StreamInlet) -> None:
+        """Wraps the inlet; see ChunkPuller."""
+        super().__init__(inlet)
+        self.latencies: List[float] = []
+        self.received: int = 0
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+
+    def _ring_write(self, block: np.ndarray) -> None:
+        """Stores a freshly pulled block (see ChunkPuller._ring_write) and counts it."""
+        super()._ring_write(block)
+        with self.ring_ready:  # reset_statistics() runs on the main thread
+            self.latencies.append(local_clock() - block[-1, 0])
+            self.received += block.shape[0]
+            if self.first_timestamp is None:
+                self.first_timestamp = block[0, 0]
+            self.last_timestamp = block[-1, 0]
+
+    def reset_statistics(self) -> None:
+        """Starts the measurement over (after the warm-up)."""
+        with self.ring_ready:
+            self.latencies.clear()
+            self.received = 0
+            self.first_timestamp = None
+
+    def lost_samples(self) -> int:
+        """Samples missing between the first and last received timestamps."""
+        if self.first_timestamp is None:
+            return 0
+        span: float = self.last_timestamp - self.first_timestamp
+        return max(0, int(round(span * self.nominal_srate)) + 1 - self.received)
+
+
+def run_case(rate: int, channels: int, fmt: str, seconds: float) -> Dict[str, Any]:
+    """
+    Records `seconds` of synthetic data in this process and measures it.
+
+    Args:
+        rate: Sample rate in Hz.
+        channels: Channel count of the source stream.
+        fmt: Recording format ("csv" or "binary").
+        seconds: Measured recording duration.
+
+    Returns:
+        The case's results.
+    """
+    name: str = f"{BENCH_SOURCE_NAME}_{rate}_{channels}_{os.getpid()}"
+    source = subprocess.Popen(
+        [
+            sys.executable,
+            str(Path(__file__).with_name("synthetic_eeg_source.py")),
+            "-n", name, "-r", str(rate), "-c", str(channels),
+            "--frequency", "34", "--vhp-stream", "",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        streams = resolve_byprop("name", name, timeout=15.0)
+        if not streams:
+            raise RuntimeError(f"Synthetic source {name} did not start")
+        inlet = StreamInlet(streams[0], max_buflen=int(seconds) + 30)
+        inlet.open_stream()
+        puller = MeasuringPuller(inlet)
+        puller.start()  # Acquire on the background thread, as sweep_lsl.main does
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                config = SimpleNamespace(format=fmt, label_column=False)
+                with open_recording(config, puller, Path(tmp) / "bench") as writer:
+                    record_to_csv(puller, WARMUP_SEC, writer)
+                    puller.reset_statistics()
+
+                    cpu_start: os.times_result = os.times()
+                    wall_start: float = time.perf_counter()
+                    record_to_csv(puller, seconds, writer)
+                    wall: float = time.perf_counter() - wall_start
+                # Leaving the block flushed the writer, so its CPU time is included
+                cpu_end: os.times_result = os.times()
+        finally:
+            puller.stop()
+    finally:
+        source.terminate()
+        source.wait()
+
+    cpu: float = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    latencies_ms: np.ndarray = np.asarray(puller.latencies or [np.nan]) * 1000
+    expected: int = puller.received + puller.lost_samples()
+    peak_rss_mb: Optional[float] = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale: float = 1 / 1024 ** 2 if sys.platform == "darwin" else 1 / 1024
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return {
+        "rate": rate,
+        "channels": channels,
+        "recorded_channels": puller.channel_count,
+        "format": fmt,
+        "samples_per_sec": puller.received / wall,
+        "cpu_percent": cpu / wall * 100,
+        "peak_rss_mb": peak_rss_mb,
+        "pull_latency_ms": {
+            "median": float(np.median(latencies_ms)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "max": float(np.max(latencies_ms)),
+        },
+        "pulls_per_sec": len(puller.latencies) / wall,
+        "lost_samples": puller.lost_samples(),
+        "loss_percent": puller.lost_samples() / expected * 100 if expected else 0.0,
+    }
+
+
+def run_case_subprocess(rate: int, channels: int, fmt: str, seconds: float) -> Dict[str, Any]:
+    """Runs one case in a fresh interpreter and returns its results."""
+    output: str = subprocess.run(
+        [sys.executable, __file__, "--case", str(rate), str(channels), fmt, "-s", str(seconds)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def case_key(case: Dict[str, Any]) -> CaseKey:
+    """Returns the grid coordinates of a result."""
+    return case["rate"], case["channels"], case["format"]
+
+
+def find_regressions(
+    case: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """
+    Compares a result with its baseline.
+
+    Args:
+        case: Current result.
+        baseline: Baseline result for the same grid point.
+        tolerance: Allowed relative degradation (0.1 = 10 %).
+
+    Returns:
+        One description per regressed metric.
+    """
+    regressions: List[str] = []
+    if case["samples_per_sec"] < baseline["samples_per_sec"] * (1 - tolerance):
+        regressions.append(
+            f"samples/s {baseline['samples_per_sec']:,.0f} -> {case['samples_per_sec']:,.0f}"
+        )
+    if case["cpu_percent"] > max(
+        baseline["cpu_percent"] * (1 + tolerance), baseline["cpu_percent"] + CPU_SLACK_PERCENT
+    ):
+        regressions.append(f"CPU {baseline['cpu_percent']:.1f}% -> {case['cpu_percent']:.1f}%")
+    if (
+        case["peak_rss_mb"] is not None
+        and baseline["peak_rss_mb"] is not None
+        and case["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance)
+    ):
+        regressions.append(
+            f"peak RSS {baseline['peak_rss_mb']:.0f} MB -> {case['peak_rss_mb']:.0f} MB"
+        )
+    old_p95: float = baseline["pull_latency_ms"]["p95"]
+    new_p95: float = case["pull_latency_ms"]["p95"]
+    if new_p95 > max(old_p95 * (1 + tolerance), old_p95 + LATENCY_SLACK_MS):
+        regressions.append(f"pull latency p95 {old_p95:.1f} ms -> {new_p95:.1f} ms")
+    if case["lost_samples"] > baseline["lost_samples"]:
+        regressions.append(f"lost samples {baseline['lost_samples']} -> {case['lost_samples']}")
+    return regressions
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(description="End-to-end sweep acquisition benchmark")
+    parser.add_argument(
+        "-r", "--rates", type=int, nargs="+", default=[2000, 10000, 20000], help="Sample rates in Hz"
+    )
+    parser.add_argument(
+        "-c", "--channels", type=int, nargs="+", default=[8, EEG_CHANNELS_COUNT],
+        help=f"Source channel counts (at most {EEG_CHANNELS_COUNT} are recorded)",
+    )
+    parser.add_argument(
+        "-f", "--formats", nargs="+", choices=RECORDING_FORMATS, default=list(RECORDING_FORMATS),
+        help="Recording formats",
+    )
+    parser.add_argument(
+        "-s", "--seconds", type=float, default=20.0, help="Measured seconds per case"
+    )
+    parser.add_argument(
+        "-o", "--output", default="bench_results.json", help="Results file (JSON)"
+    )
+    parser.add_argument("-b", "--baseline", help="Baseline results file to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="Allowed relative degradation before a regression is flagged",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Also save the results as the baseline"
+    )
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)  # Internal: one case
+    args = parser.parse_args()
+
+    if args.case:
+        rate, channels, fmt = args.case
+        print(json.dumps(run_case(int(rate), int(channels), fmt, args.seconds)))
+        return
+
+    baseline: Dict[CaseKey, Dict[str, Any]] = {}
+    if args.baseline and Path(args.baseline).exists():
+        with open(args.baseline, "r") as f:
+            baseline = {case_key(case): case for case in json.load(f)["cases"]}
+
+    print(
+        f"{'Rate':>7} {'Ch':>4} {'Format':>7} {'samples/s':>11} {'CPU %':>7} {'RSS MB':>7} "
+        f"{'p95 ms':>7} {'lost':>6}"
+    )
+    cases: List[Dict[str, Any]] = []
+    regressed: int = 0
+    for rate in args.rates:
+        for channels in args.channels:
+            for fmt in args.formats:
+                case: Dict[str, Any] = run_case_subprocess(rate, channels, fmt, args.seconds)
+                cases.append(case)
+                rss: str = f"{case['peak_rss_mb']:.0f}" if case["peak_rss_mb"] is not None else "-"
+                print(
+                    f"{rate:>7} {channels:>4} {fmt:>7} {case['samples_per_sec']:>11,.0f} "
+                    f"{case['cpu_percent']:>7.1f} {rss:>7} "
+                    f"{case['pull_latency_ms']['p95']:>7.1f} {case['lost_samples']:>6}"
+                )
+                if case["recorded_channels"] != channels:
+                    print(f"        NOTE: only {case['recorded_channels']} channels recorded")
+                if case_key(case) in baseline:
+                    for regression in find_regressions(
+                        case, baseline[case_key(case)], args.tolerance
+                    ):
+                        print(f"        REGRESSION: {regression}")
+                        regressed += 1
+
+    results: Dict[str, Any] = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seconds": args.seconds,
+        "cases": cases,
+    }
+    outputs: List[str] = [args.output]
+    if args.update_baseline and args.baseline:
+        outputs.append(args.baseline)
+    for output in outputs:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"Results written to {', '.join(outputs)}")
+
+    if baseline:
+        print(f"{regressed} regression(s) against {args.baseline}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
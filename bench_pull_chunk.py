@@ -0,0 +1,107 @@
+"""
+Benchmarks the LSL pull path used by sweep_lsl.py
+
+Compares the legacy list-based pull (pull_chunk returning nested lists, rows
+built one sample at a time) with ChunkPuller (preallocated NumPy buffer,
+vectorized row building). A local outlet with the sweep's channel layout
+pushes a backlog of synthetic data which is then drained by each method;
+only the time spent inside the pull/convert calls is counted.
+
+Usage: python bench_pull_chunk.py [-r 2000 10000 20000] [-s 10]
+"""
+
+import argparse
+import time
+from typing import Any, Callable, List
+
+import numpy as np
+from pylsl import StreamInfo, StreamInlet, StreamOutlet, resolve_stream
+
+from sweep_lsl import EEG_CHANNELS_COUNT, ChunkPuller, block_to_rows
+
+BENCH_STREAM_NAME: str = "SweepPullBench"
+
+
+def legacy_pull(inlet: StreamInlet) -> int:
+    """Pulls one chunk the way record_to_csv did before ChunkPuller."""
+    samples, timestamps = inlet.pull_chunk(timeout=0.0)
+    rows: List[List[Any]] = []
+    marker_written: bool = False
+    for sample, ts in zip(samples, timestamps):
+        label: str = ""
+        if not marker_written:
+            label = "1"
+            marker_written = True
+        rows.append([ts] + sample[:EEG_CHANNELS_COUNT] + [label])
+    return len(rows)
+
+
+def numpy_pull(puller: ChunkPuller) -> int:
+    """Pulls one chunk through ChunkPuller and converts it to CSV rows."""
+    block: np.ndarray = puller.pull_block(timeout=0.0)
+    return len(block_to_rows(block, 1))
+
+
+def run_case(
+    outlet: StreamOutlet, inlet: StreamInlet, pull: Callable[[], int], rate: int, seconds: float
+) -> float:
+    """
+    Pushes a backlog of `seconds` of data at `rate` and drains it with `pull`.
+
+    Returns:
+        Throughput in samples per second of pull/convert time.
+    """
+    total: int = int(rate * seconds)
+    chunk: int = max(1, rate // 100)
+    data: List[List[float]] = np.random.randn(chunk, EEG_CHANNELS_COUNT).astype(np.float32).tolist()
+    for _ in range(total // chunk):
+        outlet.push_chunk(data)
+    total = (total // chunk) * chunk
+
+    received: int = 0
+    busy: float = 0.0
+    deadline: float = time.perf_counter() + seconds + 30.0
+    while received < total and time.perf_counter() < deadline:
+        t0: float = time.perf_counter()
+        n: int = pull()
+        if n:
+            busy += time.perf_counter() - t0
+            received += n
+        else:
+            time.sleep(0.001)
+    return received / busy if busy > 0 else 0.0
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the sweep LSL pull path")
+    parser.add_argument(
+        "-r", "--rates", type=int, nargs="+", default=[2000, 10000, 20000], help="Sample rates in Hz"
+    )
+    parser.add_argument(
+        "-s", "--seconds", type=float, default=10.0, help="Seconds of data per measurement"
+    )
+    args = parser.parse_args()
+
+    print(f"{'Rate':>8} {'legacy (samples/s)':>20} {'numpy (samples/s)':>20} {'speedup':>8}")
+    for rate in args.rates:
+        info = StreamInfo(
+            BENCH_STREAM_NAME, "EEG", EEG_CHANNELS_COUNT, rate, "float32", f"bench_{rate}"
+        )
+        outlet = StreamOutlet(info)
+        streams = resolve_stream("source_id", f"bench_{rate}")
+        inlet = StreamInlet(streams[0], max_buflen=int(args.seconds) + 30)
+        inlet.open_stream()
+        time.sleep(0.5)
+        puller = ChunkPuller(inlet)
+
+        legacy: float = run_case(outlet, inlet, lambda: legacy_pull(inlet), rate, args.seconds)
+        vectorized: float = run_case(outlet, inlet, lambda: numpy_pull(puller), rate, args.seconds)
+        speedup: float = vectorized / legacy if legacy > 0 else 0.0
+        print(f"{rate:>8} {legacy:>20,.0f} {vectorized:>20,.0f} {speedup:>7.1f}x")
+
+        inlet.close_stream()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+"""
+Reads recordings written by sweep_lsl.py
+
+Binary recordings (``--format binary``) are opened with numpy.memmap, so
+nothing is loaded into memory until the returned arrays are indexed.
+Session recordings (``--layout session``) are opened through their segment
+index; any segment is located with one dictionary lookup and one seek.
+
+A whole sweep (metadata, per-combination recordings, baselines or a
+session) is opened lazily with SweepRecordings. CSV recordings, including
+legacy ones with a Label column, are converted once to the binary format
+next to the CSV and memory-mapped from then on.
+
+Usage:
+    from recording_reader import load_binary_recording, SessionRecording, SweepRecordings
+    header, data, timestamps = load_binary_recording("Recordings/<stem>")
+    session = SessionRecording("Recordings/<timestamp>_<board_id>_session")
+    timestamps, data = session.segment("on", channel=1, frequency=34, volume=80, cycle=1)
+    sweep = SweepRecordings("Recordings/<timestamp>_metadata.txt")
+    times, epochs, onsets = sweep.get_epochs(1, 34, 80, "on", pre=0.2, post=1.0)
+"""
+
+import csv
+import itertools
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import yaml
+
+from sweep_lsl import (
+    BINARY_DATA_SUFFIX,
+    BINARY_FORMAT_VERSION,
+    BINARY_HEADER_SUFFIX,
+    BINARY_TIMESTAMPS_SUFFIX,
+    CLOCK_LOG_SUFFIX,
+    EVENTS_SUFFIX,
+    PHASE_NAMES,
+    SEGMENTS_SUFFIX,
+    VHP_LOG_SUFFIX,
+)
+
+METADATA_SUFFIX: str = "_metadata.txt"
+MEASURE_SECTION: str = "*** Measure Configuration ***"
+DEVICE_SECTION: str = "*** Device Configuration ***"
+BASELINE_FILES_LINE: str = "\nBaseline 1 (VHP OFF>ON):"  # Follows the device configuration
+COMBINATION_PATTERN = re.compile(r"_c(\d+)_f(\d+)_v(\d+)$")
+SESSION_STEM_SUFFIX: str = "_session"  # Session recordings carry their own segment index
+CSV_CONVERSION_ROWS: int = 65536  # Rows parsed per block when converting a CSV recording
+SIDECAR_SUFFIXES: Tuple[str, ...] = (
+    EVENTS_SUFFIX,
+    SEGMENTS_SUFFIX,
+    VHP_LOG_SUFFIX,
+    CLOCK_LOG_SUFFIX,
+)
+
+SegmentKey = Tuple[str, Optional[int], Optional[int], Optional[int], Optional[int]]
+
+
+def recording_stem(path: Union[str, Path]) -> Path:
+    """
+    Strips any recording suffix (data files, header or sidecar tables) from a path.
+
+    Args:
+        path: Path to any file of a recording, or the stem itself.
+
+    Returns:
+        The recording stem.
+    """
+    path = Path(path)
+    for suffix in (
+        EVENTS_SUFFIX,
+        SEGMENTS_SUFFIX,
+        BINARY_TIMESTAMPS_SUFFIX,
+        BINARY_DATA_SUFFIX,
+        BINARY_HEADER_SUFFIX,
+        ".csv",
+    ):
+        if path.name.endswith(suffix):
+            return path.with_name(path.name[: -len(suffix)])
+    return path
+
+
+def load_binary_recording(
+    path: Union[str, Path]
+) -> Tuple[Dict[str, Any], np.ndarray, np.ndarray]:
+    """
+    Opens a binary recording as memory-mapped arrays.
+
+    Args:
+        path: Recording stem or path to any of its files.
+
+    Returns:
+        A tuple (header, data, timestamps) where data has shape
+        (samples, channels) and timestamps has shape (samples,).
+    """
+    stem: Path = recording_stem(path)
+    header: Dict[str, Any] = json.loads(
+        stem.with_name(stem.name + BINARY_HEADER_SUFFIX).read_text()
+    )
+    n_channels: int = len(header["channel_names"])
+
+    timestamps_path: Path = stem.with_name(stem.name + BINARY_TIMESTAMPS_SUFFIX)
+    data_path: Path = stem.with_name(stem.name + BINARY_DATA_SUFFIX)
+    # Size the arrays from the files, which are complete even if the header
+    # was not rewritten after an interrupted recording.
+    n_samples: int = min(
+        timestamps_path.stat().st_size // 8, data_path.stat().st_size // (4 * n_channels)
+    )
+    if n_samples == 0:
+        return (
+            header,
+            np.zeros((0, n_channels), dtype=np.float32),
+            np.zeros(0, dtype=np.float64),
+        )
+
+    timestamps = np.memmap(timestamps_path, dtype=np.float64, mode="r", shape=(n_samples,))
+    data = np.memmap(data_path, dtype=np.float32, mode="r", shape=(n_samples, n_channels))
+    return header, data, timestamps
+
+
+def optional_int(value: str) -> Optional[int]:
+    """Parses an index cell, where an empty string means not applicable."""
+    return int(value) if value != "" else None
+
+
+def read_segment_index(path: Path) -> List[Dict[str, Any]]:
+    """
+    Reads a segment index (<stem>_segments.csv).
+
+    Args:
+        path: Path of the index.
+
+    Returns:
+        One entry per segment, in recording order.
+    """
+    segments: List[Dict[str, Any]] = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            segments.append(
+                {
+                    "section": row["Section"],
+                    "phase": row["Phase"],
+                    "code": row["Code"],
+                    "channel": optional_int(row["Channel"]),
+                    "frequency": optional_int(row["Frequency"]),
+                    "volume": optional_int(row["Volume"]),
+                    "cycle": optional_int(row["Cycle"]),
+                    "start_sample": int(row["StartSample"]),
+                    "end_sample": int(row["EndSample"]),
+                    "start_timestamp": float(row["StartTimestamp"]),
+                    "end_timestamp": float(row["EndTimestamp"]),
+                    "byte_offset": int(row["ByteOffset"]),
+                }
+            )
+    return segments
+
+
+def read_measure_config(metadata_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reads the measure configuration embedded in a sweep's metadata file.
+
+    Args:
+        metadata_path: The sweep's <timestamp>_metadata.txt.
+
+    Returns:
+        The parsed measure YAML (Channel, Volume, Frequency, Baselines, Measurements).
+    """
+    text: str = Path(metadata_path).read_text()
+    start: int = text.index(MEASURE_SECTION) + len(MEASURE_SECTION)
+    return yaml.safe_load(text[start : text.index(DEVICE_SECTION)])
+
+
+def read_device_config(metadata_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reads the device configuration embedded in a sweep's metadata file.
+
+    Args:
+        metadata_path: The sweep's <timestamp>_metadata.txt.
+
+    Returns:
+        The parsed device YAML (Board, VHP).
+    """
+    text: str = Path(metadata_path).read_text()
+    start: int = text.index(DEVICE_SECTION) + len(DEVICE_SECTION)
+    return yaml.safe_load(text[start : text.index(BASELINE_FILES_LINE, start)])
+
+
+def parse_recording_name(
+    path: Union[str, Path]
+) -> Tuple[str, Optional[int], Optional[int], Optional[int]]:
+    """
+    Derives section and combination from a recording's file name.
+
+    Args:
+        path: Recording stem or path to any of its files.
+
+    Returns:
+        A tuple (section, channel, frequency, volume); the combination is None
+        for baseline 1 and sessions.
+    """
+    name: str = recording_stem(path).name
+    match = COMBINATION_PATTERN.search(name)
+    channel, frequency, volume = (int(v) for v in match.groups()) if match else (None,) * 3
+    if "_baseline_with_VHP_powered_OFF" in name:
+        return "baseline1", None, None, None
+    if "_baseline_with_VHP_powered_ON" in name:
+        return "baseline2", channel, frequency, volume
+    return "sweep", channel, frequency, volume
+
+
+def convert_csv_recording(path: Union[str, Path], force: bool = False) -> Path:
+    """
+    Converts a CSV recording to the binary format, once.
+
+    The CSV is streamed in blocks of CSV_CONVERSION_ROWS rows and written
+    next to it as <stem>.f32, <stem>.ts.f64 and <stem>.json, the files of a
+    binary recording. Markers of a legacy Label column go to the header's
+    marker list. The conversion is reused while it is newer than the CSV.
+
+    Args:
+        path: Recording stem or path to any of its files.
+        force: Convert again even if an up-to-date conversion exists.
+
+    Returns:
+        The recording stem, now readable with load_binary_recording.
+    """
+    stem: Path = recording_stem(path)
+    csv_path: Path = stem.with_name(stem.name + ".csv")
+    header_path: Path = stem.with_name(stem.name + BINARY_HEADER_SUFFIX)
+    if (
+        not force
+        and header_path.exists()
+        and header_path.stat().st_mtime >= csv_path.stat().st_mtime
+    ):
+        return stem
+
+    data_path: Path = stem.with_name(stem.name + BINARY_DATA_SUFFIX)
+    timestamps_path: Path = stem.with_name(stem.name + BINARY_TIMESTAMPS_SUFFIX)
+    markers: List[Dict[str, Any]] = []
+    sample_count: int = 0
+    first: float = 0.0
+    last: float = 0.0
+    with open(csv_path, newline="") as f, open(
+        data_path.with_name(data_path.name + ".tmp"), "wb"
+    ) as data_file, open(timestamps_path.with_name(timestamps_path.name + ".tmp"), "wb") as ts_file:
+        columns: List[str] = next(csv.reader(f))
+        labelled: bool = columns[-1] == "Label"
+        numeric: List[int] = list(range(len(columns) - 1 if labelled else len(columns)))
+        while True:
+            lines: List[str] = list(itertools.islice(f, CSV_CONVERSION_ROWS))
+            if not lines:
+                break
+            rows: np.ndarray = np.loadtxt(lines, delimiter=",", usecols=numeric, ndmin=2)
+            if labelled:
+                for i, line in enumerate(lines):
+                    label: str = line.rsplit(",", 1)[1].strip()
+                    if label:
+                        markers.append(
+                            {
+                                "sample": sample_count + i,
+                                "timestamp": float(rows[i, 0]),
+                                "code": int(float(label)),
+                            }
+                        )
+            data_file.write(np.ascontiguousarray(rows[:, 1:], dtype=np.float32).tobytes())
+            ts_file.write(np.ascontiguousarray(rows[:, 0]).tobytes())
+            if not sample_count:
+                first = float(rows[0, 0])
+            last = float(rows[-1, 0])
+            sample_count += rows.shape[0]
+
+    header: Dict[str, Any] = {
+        "version": BINARY_FORMAT_VERSION,
+        "stream_name": "",
+        # The CSV does not store the rate: estimate it from the timestamps
+        "nominal_srate": (sample_count - 1) / (last - first) if last > first else 0.0,
+        "channel_names": columns[1 : len(numeric)],
+        "data_dtype": "float32",
+        "timestamps_dtype": "float64",
+        "sample_count": sample_count,
+        "markers": markers,
+        "converted_from": csv_path.name,
+    }
+    os.replace(data_path.with_name(data_path.name + ".tmp"), data_path)
+    os.replace(timestamps_path.with_name(timestamps_path.name + ".tmp"), timestamps_path)
+    # The header is written last: it marks the conversion as complete
+    tmp_path: Path = header_path.with_name(header_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(header, indent=2))
+    os.replace(tmp_path, header_path)
+    return stem
+
+
+class SessionRecording:
+    """
+    A continuous session recording opened through its segment index.
+
+    Only the index is read up front. Segment data is read on demand: binary
+    sessions are sliced from memory maps, CSV sessions are read from the
+    segment's byte offset, or from their binary conversion if they have one
+    (converted again first if the CSV has changed since).
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """
+        Loads the segment index of a session.
+
+        Args:
+            path: Session stem or path to any of its files.
+        """
+        self.stem: Path = recording_stem(path)
+        self.segments: List[Dict[str, Any]] = []
+        self.lookup: Dict[SegmentKey, Dict[str, Any]] = {}
+
+        for segment in read_segment_index(self.stem.with_name(self.stem.name + SEGMENTS_SUFFIX)):
+            self.segments.append(segment)
+            key: SegmentKey = (
+                segment["phase"],
+                segment["channel"],
+                segment["frequency"],
+                segment["volume"],
+                segment["cycle"],
+            )
+            # A repeated key (e.g. a phase re-recorded) resolves to the latest one
+            self.lookup[key] = segment
+
+        self.binary: bool = self.stem.with_name(self.stem.name + BINARY_DATA_SUFFIX).exists()
+        self._data: Optional[np.ndarray] = None
+        self._timestamps: Optional[np.ndarray] = None
+
+    def find(
+        self,
+        phase: str,
+        channel: Optional[int] = None,
+        frequency: Optional[int] = None,
+        volume: Optional[int] = None,
+        cycle: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Looks up a segment by phase and combination.
+
+        Args:
+            phase: Phase name (e.g. "baseline3", "rest", "on", "off").
+            channel: VHP channel, None for baselines 1.
+            frequency: VHP frequency.
+            volume: VHP volume.
+            cycle: Stimulation cycle, None for baselines.
+
+        Returns:
+            The segment's index entry.
+        """
+        key: SegmentKey = (phase, channel, frequency, volume, cycle)
+        if key not in self.lookup:
+            raise KeyError(f"No segment {key} in {self.stem}")
+        return self.lookup[key]
+
+    def segment(
+        self,
+        phase: str,
+        channel: Optional[int] = None,
+        frequency: Optional[int] = None,
+        volume: Optional[int] = None,
+        cycle: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reads one segment (see find for the arguments).
+
+        Returns:
+            A tuple (timestamps, data) with data of shape (samples, channels).
+        """
+        return self.read(self.find(phase, channel, frequency, volume, cycle))
+
+    def read(self, segment: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reads the samples of an index entry.
+
+        Args:
+            segment: An entry of self.segments.
+
+        Returns:
+            A tuple (timestamps, data) with data of shape (samples, channels).
+        """
+        start: int = segment["start_sample"]
+        end: int = segment["end_sample"]
+        if self.binary:
+            if self._data is None:
+                if self.stem.with_name(self.stem.name + ".csv").exists():
+                    # The binary files are a conversion, stale if the CSV was appended to
+                    convert_csv_recording(self.stem)
+                _, self._data, self._timestamps = load_binary_recording(self.stem)
+            return self._timestamps[start:end], self._data[start:end]
+
+        csv_path: Path = self.stem.with_name(self.stem.name + ".csv")
+        with open(csv_path, newline="") as f:
+            header: List[str] = next(csv.reader(f))
+            # Read numeric columns only; a legacy Label column is skipped
+            columns: List[int] = [i for i, name in enumerate(header) if name != "Label"]
+            f.seek(segment["byte_offset"])
+            rows: np.ndarray = np.loadtxt(
+                f, delimiter=",", max_rows=end - start, usecols=columns, ndmin=2
+            )
+        return rows[:, 0], rows[:, 1:]
+
+
+class SweepRecordings:
+    """
+    All recordings of one sweep (baselines, per-combination recordings or a
+    session), opened lazily.
+
+    Only file names are read up front. Phase onsets are read from the small
+    index files on first use, and recordings are memory-mapped when first
+    sliced; CSV recordings are converted to the binary format on first
+    access (see convert_csv_recording).
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """
+        Finds the recordings of a sweep.
+
+        Args:
+            path: The sweep's <timestamp>_metadata.txt, or any recording of the sweep.
+        """
+        path = Path(path)
+        self.timestamp: str = path.name.split("_")[0]
+        self.directory: Path = path.parent
+        self.metadata_path: Path = self.directory / f"{self.timestamp}{METADATA_SUFFIX}"
+        stems: set = set()
+        for file in self.directory.glob(f"{self.timestamp}_*"):
+            if file.name.endswith((".csv", BINARY_DATA_SUFFIX)) and not file.name.endswith(
+                SIDECAR_SUFFIXES
+            ):
+                stems.add(recording_stem(file))
+        self.stems: List[Path] = sorted(stems)
+        self._measure_config: Optional[Dict[str, Any]] = None
+        self._recordings: Dict[Path, Tuple[Dict[str, Any], np.ndarray, np.ndarray]] = {}
+        self._onsets: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def measure_config(self) -> Dict[str, Any]:
+        """The sweep's measure configuration, read from the metadata file on first use."""
+        if self._measure_config is None:
+            self._measure_config = read_measure_config(self.metadata_path)
+        return self._measure_config
+
+    def open(self, stem: Path) -> Tuple[Dict[str, Any], np.ndarray, np.ndarray]:
+        """
+        Memory-maps one recording of the sweep.
+
+        Args:
+            stem: One of self.stems.
+
+        Returns:
+            A tuple (header, data, timestamps) as returned by load_binary_recording.
+        """
+        if stem not in self._recordings:
+            if stem.with_name(stem.name + ".csv").exists():
+                convert_csv_recording(stem)
+            self._recordings[stem] = load_binary_recording(stem)
+        return self._recordings[stem]
+
+    def onsets(self) -> List[Dict[str, Any]]:
+        """
+        Lists the phase onsets of all recordings, in file and sample order.
+
+        Each entry holds stem, section, phase, code, channel, frequency,
+        volume, cycle and sample (index of the first sample of the phase).
+
+        Returns:
+            The onsets of the whole sweep.
+        """
+        if self._onsets is None:
+            self._onsets = [onset for stem in self.stems for onset in self._read_onsets(stem)]
+        return self._onsets
+
+    def _read_onsets(self, stem: Path) -> List[Dict[str, Any]]:
+        """
+        Reads the onsets of one recording.
+
+        They come from its segment index if it has one (session layout, or
+        written by resegment_recordings.py), else from its event table, else
+        from the Label markers of a converted legacy CSV. Without a segment
+        index, cycles are numbered in recording order, starting at each rest.
+        """
+        segments_path: Path = stem.with_name(stem.name + SEGMENTS_SUFFIX)
+        if segments_path.exists():
+            return [
+                {
+                    "stem": stem,
+                    "section": segment["section"],
+                    "phase": segment["phase"],
+                    "code": int(segment["code"]) if segment["code"].isdigit() else segment["code"],
+                    "channel": segment["channel"],
+                    "frequency": segment["frequency"],
+                    "volume": segment["volume"],
+                    "cycle": segment["cycle"],
+                    "sample": segment["start_sample"],
+                }
+                for segment in read_segment_index(segments_path)
+            ]
+
+        section, channel, frequency, volume = parse_recording_name(stem)
+        events: List[Tuple[int, int, Optional[int], Optional[int], Optional[int]]]
+        events_path: Path = stem.with_name(stem.name + EVENTS_SUFFIX)
+        if events_path.exists():
+            with open(events_path, newline="") as f:
+                events = [
+                    (
+                        int(row["Sample"]),
+                        int(row["Code"]),
+                        optional_int(row["Channel"]),
+                        optional_int(row["Frequency"]),
+                        optional_int(row["Volume"]),
+                    )
+                    for row in csv.DictReader(f)
+                ]
+        else:
+            header: Dict[str, Any] = self.open(stem)[0]
+            events = [
+                (marker["sample"], int(marker["code"]), channel, frequency, volume)
+                for marker in header["markers"]
+            ]
+
+        onsets: List[Dict[str, Any]] = []
+        cycles: Dict[Tuple[Optional[int], ...], int] = {}
+        for sample, code, event_channel, event_frequency, event_volume in events:
+            combination: Tuple[Optional[int], ...] = (event_channel, event_frequency, event_volume)
+            if code == 0:
+                cycles[combination] = cycles.get(combination, 0) + 1
+            onsets.append(
+                {
+                    "stem": stem,
+                    "section": section,
+                    "phase": PHASE_NAMES.get(code, str(code)),
+                    "code": code,
+                    "channel": event_channel,
+                    "frequency": event_frequency,
+                    "volume": event_volume,
+                    "cycle": cycles.get(combination) if code in (0, 1, 11) else None,
+                    "sample": sample,
+                }
+            )
+        return onsets
+
+    def find_onsets(
+        self,
+        channel: Optional[int],
+        frequency: Optional[int],
+        volume: Optional[int],
+        phase: Union[str, int],
+    ) -> List[Dict[str, Any]]:
+        """
+        Selects the onsets of one phase of one combination.
+
+        Args:
+            channel: VHP channel, None for baselines 1.
+            frequency: VHP frequency.
+            volume: VHP volume.
+            phase: Phase name (e.g. "on", "off", "rest", "baseline3") or marker code.
+
+        Returns:
+            The matching entries of onsets(), in recording order.
+        """
+        key: str = "code" if isinstance(phase, int) else "phase"
+        return [
+            onset
+            for onset in self.onsets()
+            if onset[key] == phase
+            and (onset["channel"], onset["frequency"], onset["volume"])
+            == (channel, frequency, volume)
+        ]
+
+    def get_epochs(
+        self,
+        channel: Optional[int],
+        frequency: Optional[int],
+        volume: Optional[int],
+        phase: Union[str, int],
+        pre: float = 0.0,
+        post: float = 1.0,
+    ) -> Tuple[np.ndarray, List[np.ndarray], List[Dict[str, Any]]]:
+        """
+        Cuts an epoch around every onset of one phase of one combination.
+
+        Args:
+            channel: VHP channel, None for baselines 1.
+            frequency: VHP frequency.
+            volume: VHP volume.
+            phase: Phase name (e.g. "on", "off", "rest", "baseline3") or marker code.
+            pre: Seconds before the onset.
+            post: Seconds after the onset.
+
+        Returns:
+            A tuple (times, epochs, onsets): sample times in seconds relative
+            to the onset, one (len(times), channels) view into the
+            memory-mapped data per epoch, and the onset of each epoch. Onsets
+            whose epoch would extend past their recording are left out.
+        """
+        times: Optional[np.ndarray] = None
+        epochs: List[np.ndarray] = []
+        used: List[Dict[str, Any]] = []
+        for onset in self.find_onsets(channel, frequency, volume, phase):
+            header, data, _ = self.open(onset["stem"])
+            rate: float = header["nominal_srate"]
+            before: int = int(round(pre * rate))
+            after: int = int(round(post * rate))
+            if times is None:
+                times = np.arange(-before, after) / rate
+            start: int = onset["sample"] - before
+            if start < 0 or onset["sample"] + after > data.shape[0]:
+                continue
+            epochs.append(data[start : onset["sample"] + after])
+            used.append(onset)
+        return (times if times is not None else np.zeros(0)), epochs, used
@@ -0,0 +1,652 @@
+"""
+SQLite catalog of the recordings written by sweep_lsl.py
+
+Indexes every recording of one or more directories into a local SQLite
+database: session (sweep timestamp, board, measure configuration), the
+combination of each recording, every phase with its sample range, sample
+count and byte offset, a content hash of each data file and quality
+statistics (effective rate, timestamp gaps, dropped samples). Queries such
+as "all ON phases at 28 Hz and volume 100" are answered from indexed tables
+in milliseconds instead of globbing and opening files.
+
+Indexing is incremental: a recording is skipped while the size and
+modification time of its data file and of the files its entry is built
+from (segment index, event table, binary timestamps and header, session
+metadata) are unchanged. A touched data file whose hash is unchanged is
+not re-read unless one of those files changed too, and files that
+disappeared are removed. Changed files are scanned in parallel.
+
+Usage: python recordings_catalog.py index [Recordings ...] [-c Recordings/catalog.sqlite]
+       python recordings_catalog.py query [--frequency 28] [--volume 100] [--phase on]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from recording_reader import (
+    METADATA_SUFFIX,
+    SIDECAR_SUFFIXES,
+    load_binary_recording,
+    optional_int,
+    parse_recording_name,
+    read_device_config,
+    read_measure_config,
+    read_segment_index,
+    recording_stem,
+)
+from sweep_lsl import (
+    BINARY_DATA_SUFFIX,
+    BINARY_HEADER_SUFFIX,
+    BINARY_TIMESTAMPS_SUFFIX,
+    EVENTS_SUFFIX,
+    GAP_THRESHOLD_PERIODS,
+    PHASE_NAMES,
+    SEGMENTS_SUFFIX,
+)
+
+DEFAULT_CATALOG_NAME: str = "catalog.sqlite"
+CATALOG_SCHEMA_VERSION: int = 2  # Bump to rebuild catalogs written by older versions
+HASH_BLOCK_BYTES: int = 1 << 20
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    board_id TEXT,
+    recorded_on TEXT,
+    metadata_path TEXT,
+    metadata_mtime REAL,
+    measure_config TEXT
+);
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session TEXT NOT NULL,
+    section TEXT,
+    channel INTEGER,
+    frequency INTEGER,
+    volume INTEGER,
+    format TEXT,
+    size INTEGER,
+    mtime REAL,
+    dependencies TEXT,
+    hash TEXT,
+    sample_count INTEGER,
+    nominal_srate REAL,
+    effective_srate REAL,
+    first_timestamp REAL,
+    last_timestamp REAL,
+    gaps INTEGER,
+    dropped_samples INTEGER,
+    largest_gap REAL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    recording_id INTEGER NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+    session TEXT NOT NULL,
+    phase TEXT,
+    code TEXT,
+    channel INTEGER,
+    frequency INTEGER,
+    volume INTEGER,
+    cycle INTEGER,
+    start_sample INTEGER,
+    end_sample INTEGER,
+    sample_count INTEGER,
+    start_timestamp REAL,
+    byte_offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS recordings_session ON recordings(session);
+CREATE INDEX IF NOT EXISTS recordings_combination ON recordings(frequency, volume, channel);
+CREATE INDEX IF NOT EXISTS phases_combination ON phases(frequency, volume, channel, phase);
+CREATE INDEX IF NOT EXISTS phases_phase ON phases(phase);
+CREATE INDEX IF NOT EXISTS phases_recording ON phases(recording_id);
+"""
+
+
+def file_hash(path: Path) -> str:
+    """Returns the BLAKE2b digest of a file, read in HASH_BLOCK_BYTES blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dependency_files(path: Path) -> List[Path]:
+    """
+    Lists the files besides the data file that a recording's catalog entry is read from.
+
+    Args:
+        path: Main data file (.csv or .f32).
+
+    Returns:
+        The paths, whether or not they exist.
+    """
+    stem: Path = recording_stem(path)
+    suffixes: List[str] = [SEGMENTS_SUFFIX, EVENTS_SUFFIX]
+    if path.name.endswith(BINARY_DATA_SUFFIX):
+        suffixes += [BINARY_TIMESTAMPS_SUFFIX, BINARY_HEADER_SUFFIX]
+    files: List[Path] = [stem.with_name(stem.name + suffix) for suffix in suffixes]
+    files.append(path.parent / f"{path.name.split('_')[0]}{METADATA_SUFFIX}")
+    return files
+
+
+def dependency_key(path: Path) -> str:
+    """
+    Returns name, size and modification time of a recording's existing
+    dependency files (see dependency_files), as stored in the catalog.
+    """
+    entries: List[Tuple[str, int, float]] = []
+    for file in dependency_files(path):
+        if file.exists():
+            status = file.stat()
+            entries.append((file.name, status.st_size, status.st_mtime))
+    return json.dumps(entries)
+
+
+def quality_stats(timestamps: np.ndarray, nominal_srate: float) -> Dict[str, Any]:
+    """
+    Computes timing statistics of a recording.
+
+    Gaps are counted as in sweep_lsl.SampleLossMonitor: intervals longer
+    than GAP_THRESHOLD_PERIODS sample periods.
+
+    Args:
+        timestamps: Sample timestamps.
+        nominal_srate: Nominal rate, 0 if unknown.
+
+    Returns:
+        Column values for the recordings table.
+    """
+    stats: Dict[str, Any] = {
+        "sample_count": len(timestamps),
+        "nominal_srate": nominal_srate,
+        "effective_srate": None,
+        "first_timestamp": float(timestamps[0]) if len(timestamps) else None,
+        "last_timestamp": float(timestamps[-1]) if len(timestamps) else None,
+        "gaps": 0,
+        "dropped_samples": 0,
+        "largest_gap": 0.0,
+    }
+    if len(timestamps) < 2:
+        return stats
+    intervals: np.ndarray = np.diff(timestamps)
+    if nominal_srate <= 0:
+        # CSV recordings do not store the rate: take it from the typical interval
+        median: float = float(np.median(intervals))
+        nominal_srate = 1.0 / median if median > 0 else 0.0
+        stats["nominal_srate"] = nominal_srate
+    span: float = float(timestamps[-1] - timestamps[0])
+    stats["effective_srate"] = (len(timestamps) - 1) / span if span > 0 else None
+    if nominal_srate > 0:
+        gaps: np.ndarray = intervals[intervals * nominal_srate > GAP_THRESHOLD_PERIODS]
+        stats["gaps"] = int(gaps.size)
+        stats["dropped_samples"] = int(np.round(gaps * nominal_srate).sum()) - int(gaps.size)
+        stats["largest_gap"] = float(gaps.max()) if gaps.size else 0.0
+    return stats
+
+
+def read_onsets(stem: Path) -> Optional[List[Dict[str, Any]]]:
+    """
+    Reads the phases of a recording from its segment index or event table.
+
+    Args:
+        stem: Recording stem.
+
+    Returns:
+        Phases with their start (and, from a segment index, end and byte
+        offset), or None if the recording has neither file.
+    """
+    segments_path: Path = stem.with_name(stem.name + SEGMENTS_SUFFIX)
+    if segments_path.exists():
+        return [
+            {
+                "phase": segment["phase"],
+                "code": segment["code"],
+                "channel": segment["channel"],
+                "frequency": segment["frequency"],
+                "volume": segment["volume"],
+                "cycle": segment["cycle"],
+                "start_sample": segment["start_sample"],
+                "end_sample": segment["end_sample"],
+                "byte_offset": segment["byte_offset"],
+            }
+            for segment in read_segment_index(segments_path)
+        ]
+    events_path: Path = stem.with_name(stem.name + EVENTS_SUFFIX)
+    if events_path.exists():
+        with open(events_path, newline="") as f:
+            return [
+                {
+                    "code": row["Code"],
+                    "channel": optional_int(row["Channel"]),
+                    "frequency": optional_int(row["Frequency"]),
+                    "volume": optional_int(row["Volume"]),
+                    "start_sample": int(row["Sample"]),
+                }
+                for row in csv.DictReader(f)
+            ]
+    return None
+
+
+def scan_csv(
+    path: Path, onsets: Optional[List[Dict[str, Any]]]
+) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Streams a CSV recording, parsing only the first and last field of each line.
+
+    Args:
+        path: Path of the CSV recording.
+        onsets: Known phase onsets; None to take them from a Label column.
+
+    Returns:
+        A tuple (timestamps, onsets) where every onset has its byte offset.
+    """
+    wanted: Dict[int, List[Dict[str, Any]]] = {}
+    for onset in onsets or []:
+        wanted.setdefault(onset["start_sample"], []).append(onset)
+    found: List[Dict[str, Any]] = []
+    timestamps: array = array("d")
+    with open(path, "rb") as f:
+        labelled: bool = f.readline().rstrip().endswith(b",Label")
+        offset: int = f.tell()
+        for sample, line in enumerate(f):
+            timestamps.append(float(line[: line.index(b",")]))
+            if onsets is None and labelled:
+                label: bytes = line[line.rindex(b",") + 1 :].strip()
+                if label:
+                    found.append(
+                        {"code": str(int(float(label))), "start_sample": sample, "byte_offset": offset}
+                    )
+            for onset in wanted.get(sample, ()):
+                onset.setdefault("byte_offset", offset)
+            offset += len(line)
+    return np.frombuffer(timestamps, dtype=np.float64), onsets if onsets is not None else found
+
+
+def scan_recording(path: Path, known_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reads everything the catalog stores about one recording.
+
+    Args:
+        path: Main data file (.csv or .f32).
+        known_hash: Hash currently in the catalog; if the file still matches
+            it, only the hash is returned.
+
+    Returns:
+        The recording's columns, with its phases under "phases"; or only
+        "hash" and "unchanged" if the content matches known_hash.
+    """
+    digest: str = file_hash(path)
+    if digest == known_hash:
+        return {"hash": digest, "unchanged": True}
+
+    stem: Path = recording_stem(path)
+    section, channel, frequency, volume = parse_recording_name(stem)
+    onsets: Optional[List[Dict[str, Any]]] = read_onsets(stem)
+    if path.suffix == ".csv":
+        timestamps, onsets = scan_csv(path, onsets)
+        stats: Dict[str, Any] = quality_stats(timestamps, 0.0)
+        row_bytes: int = 0
+    else:
+        header, data, timestamps = load_binary_recording(stem)
+        stats = quality_stats(np.asarray(timestamps), header["nominal_srate"])
+        row_bytes = 4 * data.shape[1]
+        onsets = onsets if onsets is not None else [
+            {"code": str(marker["code"]), "start_sample": marker["sample"]}
+            for marker in header["markers"]
+        ]
+
+    # Phases without an end (event tables, Label markers) run to the next onset
+    cycle: int = 0
+    phases: List[Dict[str, Any]] = []
+    for i, onset in enumerate(onsets):
+        code: str = str(onset["code"])
+        if "cycle" not in onset and code == "0":
+            cycle += 1
+        end: int = onset.get(
+            "end_sample",
+            onsets[i + 1]["start_sample"] if i + 1 < len(onsets) else stats["sample_count"],
+        )
+        phases.append(
+            {
+                "phase": onset.get(
+                    "phase", PHASE_NAMES.get(int(code), code) if code.isdigit() else code
+                ),
+                "code": code,
+                "channel": onset.get("channel", channel),
+                "frequency": onset.get("frequency", frequency),
+                "volume": onset.get("volume", volume),
+                "cycle": onset.get("cycle", cycle if code in ("0", "1", "11") else None),
+                "start_sample": onset["start_sample"],
+                "end_sample": end,
+                "sample_count": end - onset["start_sample"],
+                "start_timestamp": (
+                    float(timestamps[onset["start_sample"]])
+                    if onset["start_sample"] < stats["sample_count"]
+                    else None
+                ),
+                "byte_offset": onset.get("byte_offset", onset["start_sample"] * row_bytes),
+            }
+        )
+    return {
+        "hash": digest,
+        "section": section,
+        "channel": channel,
+        "frequency": frequency,
+        "volume": volume,
+        "format": "csv" if path.suffix == ".csv" else "binary",
+        **stats,
+        "phases": phases,
+    }
+
+
+def find_data_files(directory: Path) -> List[Path]:
+    """
+    Lists the main data file of every recording in a directory.
+
+    Binary files converted from a CSV by recording_reader are caches of
+    that CSV and are left out.
+    """
+    files: List[Path] = []
+    for path in sorted(directory.glob("*")):
+        if path.name.endswith(SIDECAR_SUFFIXES):
+            continue
+        if path.suffix == ".csv":
+            files.append(path)
+        elif path.name.endswith(BINARY_DATA_SUFFIX):
+            stem: Path = recording_stem(path)
+            if not stem.with_name(stem.name + ".csv").exists():
+                files.append(path)
+    return files
+
+
+class RecordingsCatalog:
+    """SQLite catalog of recordings, updated incrementally with update()."""
+
+    def __init__(self, path: Path) -> None:
+        """
+        Opens (or creates) the catalog.
+
+        Args:
+            path: Path of the SQLite database.
+        """
+        self.path: Path = path
+        self.db: sqlite3.Connection = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != CATALOG_SCHEMA_VERSION:
+            for table in ("phases", "recordings", "sessions"):
+                self.db.execute(f"DROP TABLE IF EXISTS {table}")
+            self.db.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+
+    def update(self, directories: List[Path], jobs: Optional[int] = None) -> Dict[str, int]:
+        """
+        Brings the catalog in line with the recordings of some directories.
+
+        Args:
+            directories: Directories holding recordings and metadata files.
+            jobs: Parallel worker processes for scanning (default: CPU count).
+
+        Returns:
+            Counts of added, updated, touched (same content), unchanged and removed recordings.
+        """
+        counts: Dict[str, int] = dict.fromkeys(
+            ("added", "updated", "touched", "unchanged", "removed"), 0
+        )
+        known: Dict[str, sqlite3.Row] = {
+            row["path"]: row
+            for row in self.db.execute(
+                "SELECT id, path, size, mtime, dependencies, hash FROM recordings"
+            )
+        }
+        present: set = set()
+        pending: List[Tuple[Path, Optional[sqlite3.Row], str]] = []
+        for directory in directories:
+            for path in find_data_files(directory):
+                key: str = str(path.resolve())
+                present.add(key)
+                status = path.stat()
+                dependencies: str = dependency_key(path)
+                row: Optional[sqlite3.Row] = known.get(key)
+                if row is not None and (row["size"], row["mtime"], row["dependencies"]) == (
+                    status.st_size,
+                    status.st_mtime,
+                    dependencies,
+                ):
+                    counts["unchanged"] += 1
+                    continue
+                pending.append((path, row, dependencies))
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(
+                scan_recording,
+                [path for path, _, _ in pending],
+                # With a changed segment index, event table or metadata the
+                # phases must be read again even if the data file is the same
+                [
+                    row["hash"] if row is not None and row["dependencies"] == dependencies else None
+                    for _, row, dependencies in pending
+                ],
+            )
+            for (path, row, dependencies), result in zip(pending, results):
+                status = path.stat()
+                if result.get("unchanged"):
+                    self.db.execute(
+                        "UPDATE recordings SET size = ?, mtime = ? WHERE id = ?",
+                        (status.st_size, status.st_mtime, row["id"]),
+                    )
+                    counts["touched"] += 1
+                    continue
+                self._store(path, status, dependencies, result, row)
+                counts["updated" if row is not None else "added"] += 1
+
+        # Only recordings of the indexed directories can have disappeared
+        indexed: set = {directory.resolve() for directory in directories}
+        for key, row in known.items():
+            if key not in present and Path(key).parent in indexed:
+                self.db.execute("DELETE FROM recordings WHERE id = ?", (row["id"],))
+                counts["removed"] += 1
+        self.db.execute(
+            "DELETE FROM sessions WHERE session NOT IN (SELECT DISTINCT session FROM recordings)"
+        )
+        self.db.commit()
+        return counts
+
+    def _store(
+        self,
+        path: Path,
+        status: os.stat_result,
+        dependencies: str,
+        result: Dict[str, Any],
+        previous: Optional[sqlite3.Row],
+    ) -> None:
+        """Writes one scanned recording (and its session) to the catalog."""
+        session: str = path.name.split("_")[0]
+        self._store_session(path.parent, session)
+        if previous is not None:
+            self.db.execute("DELETE FROM recordings WHERE id = ?", (previous["id"],))
+        columns: Dict[str, Any] = {
+            key: value for key, value in result.items() if key not in ("phases", "unchanged")
+        }
+        columns.update(
+            path=str(path.resolve()),
+            session=session,
+            size=status.st_size,
+            mtime=status.st_mtime,
+            dependencies=dependencies,
+        )
+        recording_id: int = self.db.execute(
+            f"INSERT INTO recordings ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            list(columns.values()),
+        ).lastrowid
+        self.db.executemany(
+            "INSERT INTO phases (recording_id, session, phase, code, channel, frequency, volume, "
+            "cycle, start_sample, end_sample, sample_count, start_timestamp, byte_offset) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    recording_id,
+                    session,
+                    phase["phase"],
+                    phase["code"],
+                    phase["channel"],
+                    phase["frequency"],
+                    phase["volume"],
+                    phase["cycle"],
+                    phase["start_sample"],
+                    phase["end_sample"],
+                    phase["sample_count"],
+                    phase["start_timestamp"],
+                    phase["byte_offset"],
+                )
+                for phase in result["phases"]
+            ],
+        )
+
+    def _store_session(self, directory: Path, session: str) -> None:
+        """Records a session from its metadata file, unless it is catalogued from the same file."""
+        metadata: Path = directory / f"{session}{METADATA_SUFFIX}"
+        metadata_mtime: Optional[float] = metadata.stat().st_mtime if metadata.exists() else None
+        row: Optional[sqlite3.Row] = self.db.execute(
+            "SELECT metadata_mtime FROM sessions WHERE session = ?", (session,)
+        ).fetchone()
+        if row is not None and row["metadata_mtime"] == metadata_mtime:
+            return
+        board_id: Optional[str] = None
+        recorded_on: Optional[str] = None
+        measure_config: Optional[str] = None
+        if metadata.exists():
+            first_line: str = metadata.read_text().split("\n", 1)[0]
+            if first_line.startswith("Recording on: "):
+                recorded_on = datetime.strptime(
+                    first_line[len("Recording on: ") :], "%d/%m/%Y %H:%M:%S"
+                ).isoformat()
+            board_id = str(read_device_config(metadata)["Board"]["Id"])
+            measure_config = json.dumps(read_measure_config(metadata))
+        self.db.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                session,
+                board_id,
+                recorded_on,
+                str(metadata.resolve()),
+                metadata_mtime,
+                measure_config,
+            ),
+        )
+
+    def find_phases(
+        self,
+        channel: Optional[int] = None,
+        frequency: Optional[int] = None,
+        volume: Optional[int] = None,
+        phase: Optional[str] = None,
+        board_id: Optional[str] = None,
+        session: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Looks up phases; every filter left as None matches anything.
+
+        Args:
+            channel: VHP channel.
+            frequency: VHP frequency.
+            volume: VHP volume.
+            phase: Phase name (e.g. "on", "off", "rest", "baseline3").
+            board_id: Board id from the device configuration.
+            session: Sweep timestamp (<yymmdd-HHMM>).
+
+        Returns:
+            One dict per phase with its recording's path, format and quality statistics.
+        """
+        filters: Dict[str, Any] = {
+            "p.channel": channel,
+            "p.frequency": frequency,
+            "p.volume": volume,
+            "p.phase": phase,
+            "s.board_id": board_id,
+            "p.session": session,
+        }
+        clauses: List[str] = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        rows = self.db.execute(
+            "SELECT p.session, s.board_id, p.phase, p.code, p.channel, p.frequency, p.volume, "
+            "p.cycle, p.start_sample, p.end_sample, p.sample_count, p.start_timestamp, "
+            "p.byte_offset, r.path, r.format, r.nominal_srate, r.dropped_samples, r.hash "
+            "FROM phases p JOIN recordings r ON r.id = p.recording_id "
+            "LEFT JOIN sessions s ON s.session = p.session"
+            + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            + " ORDER BY p.session, r.path, p.start_sample",
+            [value for value in filters.values() if value is not None],
+        )
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Closes the database."""
+        self.db.close()
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(description="SQLite catalog of sweep recordings")
+    parser.add_argument(
+        "-c", "--catalog", help=f"Catalog database (default: <first directory>/{DEFAULT_CATALOG_NAME})"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    index = commands.add_parser("index", help="Add new and changed recordings to the catalog")
+    index.add_argument("directories", nargs="*", default=["Recordings"], help="Recordings directories")
+    index.add_argument("-j", "--jobs", type=int, help="Parallel worker processes (default: CPU count)")
+    query = commands.add_parser("query", help="List catalogued phases")
+    query.add_argument("--channel", type=int)
+    query.add_argument("--frequency", type=int)
+    query.add_argument("--volume", type=int)
+    query.add_argument("--phase", help="Phase name, e.g. on, off, rest, baseline3")
+    query.add_argument("--board", help="Board id")
+    query.add_argument("--session", help="Sweep timestamp (yymmdd-HHMM)")
+    args = parser.parse_args()
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
+
+    directories: List[Path] = [Path(d) for d in getattr(args, "directories", ["Recordings"])]
+    catalog = RecordingsCatalog(Path(args.catalog or directories[0] / DEFAULT_CATALOG_NAME))
+    try:
+        if args.command == "index":
+            start: float = time.perf_counter()
+            counts: Dict[str, int] = catalog.update(directories, args.jobs)
+            logging.info(
+                ", ".join(f"{n} {status}" for status, n in counts.items())
+                + f" in {time.perf_counter() - start:.2f} s"
+            )
+            return
+
+        start = time.perf_counter()
+        phases: List[Dict[str, Any]] = catalog.find_phases(
+            args.channel, args.frequency, args.volume, args.phase, args.board, args.session
+        )
+        elapsed_ms: float = (time.perf_counter() - start) * 1000
+        for phase in phases:
+            print(
+                f"{phase['session']}  c{phase['channel']} f{phase['frequency']} v{phase['volume']} "
+                f"{phase['phase']:<18} cycle {phase['cycle'] if phase['cycle'] is not None else '-':<3} "
+                f"samples {phase['start_sample']}-{phase['end_sample']} "
+                f"@{phase['byte_offset']}  {Path(phase['path']).name}"
+            )
+        logging.info(f"{len(phases)} phases in {elapsed_ms:.1f} ms")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
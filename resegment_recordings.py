@@ -0,0 +1,283 @@
+"""
+Re-segments legacy CSV recordings of sweep_lsl.py offline
+
+Recordings made with the Label column mark only the first sample pulled by
+each phase. That sample is usually older than the phase: whatever was still
+buffered in the inlet when a phase started (samples in transit, the serial
+command delay, the wait for the VHP to power on) was pulled by it. The end
+of a phase is reliable, though: a phase pulled until its duration had
+elapsed, and the next phase's first pulled sample follows seamlessly.
+
+Each phase is therefore reconstructed backwards from its end, the next
+marker (or the end of the file), over its configured duration read from the
+measure configuration in <timestamp>_metadata.txt:
+
+    end   = timestamp of the next marker (or last sample + 1 / rate)
+    start = max(own marker, end - duration)
+
+The corrected phases are written as a segment index next to each recording
+(<stem>_segments.csv, the session layout's format), so recordings can be
+opened with recording_reader.SessionRecording. Files are streamed twice
+line by line, never loaded whole, and processed in parallel.
+
+Usage: python resegment_recordings.py [Recordings] [-j 4] [--force]
+"""
+
+import argparse
+import csv
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from recording_reader import (
+    METADATA_SUFFIX,
+    SESSION_STEM_SUFFIX,
+    SIDECAR_SUFFIXES,
+    parse_recording_name,
+    read_measure_config,
+)
+from sweep_lsl import PHASE_NAMES, SEGMENTS_HEADER, SEGMENTS_SUFFIX
+
+VHP_OFF_RECORDING_SEC: float = 10.0  # Marker 3 phase, recorded for a fixed 10 s by sweep_lsl.main
+# Phases shorter than configured by more than this are reported; a few
+# milliseconds come and go with the chunk timing of pull-based recording
+SHORT_PHASE_TOLERANCE_SEC: float = 0.02
+
+
+def read_durations(metadata_path: Path) -> Dict[str, Dict[int, float]]:
+    """
+    Reads the phase durations of a sweep from its metadata file.
+
+    Args:
+        metadata_path: The sweep's <timestamp>_metadata.txt.
+
+    Returns:
+        Duration in seconds per marker code, for each section.
+    """
+    measurement: Dict[str, Any] = read_measure_config(metadata_path)
+    baselines: Dict[str, Any] = measurement["Baselines"]
+    cycles: Dict[str, Any] = measurement["Measurements"]
+    return {
+        "baseline1": {3: VHP_OFF_RECORDING_SEC, 33: float(baselines["Baseline_1"])},
+        "baseline2": {31: float(baselines["Baseline_2"]), 33: float(baselines["Baseline_2"])},
+        # Rest lasts Duration_on, as in do_measurement
+        "sweep": {
+            333: float(baselines["Baseline_3"]),
+            0: float(cycles["Duration_on"]),
+            1: float(cycles["Duration_on"]),
+            11: float(cycles["Duration_off"]),
+        },
+    }
+
+
+def scan_markers(path: Path) -> Tuple[List[Tuple[int, int, float, int]], int, float, float]:
+    """
+    First pass: collects the labelled rows of a recording.
+
+    Only the first and last field of each line are parsed.
+
+    Args:
+        path: Path of the CSV recording.
+
+    Returns:
+        A tuple (markers, rows, first timestamp, last timestamp) where each
+        marker is (sample, byte offset, timestamp, code).
+    """
+    markers: List[Tuple[int, int, float, int]] = []
+    rows: int = 0
+    first: float = 0.0
+    last: float = 0.0
+    with open(path, "rb") as f:
+        offset: int = len(f.readline())
+        for line in f:
+            timestamp: float = float(line[: line.index(b",")])
+            label: bytes = line[line.rindex(b",") + 1 :].strip()
+            if label:
+                markers.append((rows, offset, timestamp, int(float(label))))
+            if rows == 0:
+                first = timestamp
+            last = timestamp
+            rows += 1
+            offset += len(line)
+    return markers, rows, first, last
+
+
+def locate(path: Path, boundaries: List[float]) -> List[Tuple[int, int, float, float]]:
+    """
+    Second pass: finds the first row at or after each boundary timestamp.
+
+    Args:
+        path: Path of the CSV recording.
+        boundaries: Timestamps in ascending order.
+
+    Returns:
+        For each boundary, (sample, byte offset, timestamp, timestamp of the
+        previous row) of that row; past the last row, sample and byte offset
+        are the row count and the file size.
+    """
+    found: List[Tuple[int, int, float, float]] = []
+    with open(path, "rb") as f:
+        offset: int = len(f.readline())
+        sample: int = 0
+        previous: float = float("nan")
+        for line in f:
+            if len(found) == len(boundaries):
+                break
+            timestamp: float = float(line[: line.index(b",")])
+            while len(found) < len(boundaries) and timestamp >= boundaries[len(found)]:
+                found.append((sample, offset, timestamp, previous))
+            previous = timestamp
+            sample += 1
+            offset += len(line)
+        while len(found) < len(boundaries):
+            found.append((sample, offset, float("nan"), previous))
+    return found
+
+
+def resegment(path: Path, durations: Dict[str, Dict[int, float]], force: bool = False) -> str:
+    """
+    Reconstructs the phases of one recording and writes its segment index.
+
+    Args:
+        path: Path of the CSV recording.
+        durations: Phase durations per section, from read_durations.
+        force: Overwrite an existing segment index.
+
+    Returns:
+        A one-line summary.
+    """
+    output: Path = path.with_name(path.stem + SEGMENTS_SUFFIX)
+    if output.exists() and not force:
+        return f"{path.name}: skipped, {output.name} exists"
+    with open(path, "r") as f:
+        if next(csv.reader(f))[-1] != "Label":
+            return f"{path.name}: skipped, no Label column"
+
+    section, channel, frequency, volume = parse_recording_name(path)
+    markers, rows, first, last = scan_markers(path)
+    if not markers:
+        return f"{path.name}: skipped, no markers"
+    period: float = (last - first) / (rows - 1) if rows > 1 else 0.0
+
+    phases: List[Dict[str, Any]] = []
+    cycle: int = 0
+    for i, (_, _, timestamp, code) in enumerate(markers):
+        if section == "sweep" and code == 0:
+            cycle += 1
+        end: float = markers[i + 1][2] if i + 1 < len(markers) else last + period
+        duration: Optional[float] = durations[section].get(code)
+        start: float = timestamp if duration is None else max(timestamp, end - duration)
+        phases.append(
+            {
+                "code": code,
+                "cycle": cycle if section == "sweep" and code != 333 else None,
+                "start": start,
+                "end": end,
+                "short": (
+                    duration is not None
+                    and end - timestamp < duration - SHORT_PHASE_TOLERANCE_SEC
+                ),
+            }
+        )
+
+    # Segments start at the first row at or after their start and end
+    # (exclusive) at the first row at or after their end
+    boundaries: List[float] = sorted({p["start"] for p in phases} | {p["end"] for p in phases})
+    rows_at: Dict[float, Tuple[int, int, float, float]] = dict(
+        zip(boundaries, locate(path, boundaries))
+    )
+
+    trimmed: int = 0
+    with open(output, "w", newline="") as f:
+        index = csv.writer(f)
+        index.writerow(SEGMENTS_HEADER)
+        for phase, (marker_sample, _, _, _) in zip(phases, markers):
+            start_sample, byte_offset, start_timestamp, _ = rows_at[phase["start"]]
+            end_sample, _, _, end_timestamp = rows_at[phase["end"]]
+            trimmed += start_sample - marker_sample
+            if phase["short"]:
+                logging.warning(
+                    f"{path.name}: {PHASE_NAMES.get(phase['code'], phase['code'])} at sample "
+                    f"{marker_sample} is shorter than its configured duration"
+                )
+            index.writerow(
+                [
+                    section,
+                    PHASE_NAMES.get(phase["code"], str(phase["code"])),
+                    phase["code"],
+                    channel,
+                    frequency,
+                    volume,
+                    phase["cycle"],
+                    start_sample,
+                    end_sample,
+                    start_timestamp,
+                    end_timestamp,
+                    byte_offset,
+                ]
+            )
+    return (
+        f"{path.name}: {len(phases)} phases, {rows} samples, "
+        f"{trimmed * period / len(phases) * 1000:.1f} ms trimmed per phase on average"
+    )
+
+
+def find_recordings(directory: Path) -> List[Tuple[Path, Path]]:
+    """
+    Lists the CSV recordings of a directory with their sweep's metadata file.
+
+    Args:
+        directory: Recordings directory.
+
+    Returns:
+        Pairs (recording, metadata file); recordings without metadata are logged and left out.
+    """
+    recordings: List[Tuple[Path, Path]] = []
+    for path in sorted(directory.glob("*.csv")):
+        if path.name.endswith(SIDECAR_SUFFIXES) or path.stem.endswith(SESSION_STEM_SUFFIX):
+            continue
+        metadata: Path = directory / f"{path.name.split('_')[0]}{METADATA_SUFFIX}"
+        if not metadata.exists():
+            logging.warning(f"{path.name}: no {metadata.name}, skipped")
+            continue
+        recordings.append((path, metadata))
+    return recordings
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(
+        description="Rebuild phase intervals of legacy Label-column recordings"
+    )
+    parser.add_argument(
+        "directory", nargs="?", default="Recordings", help="Recordings directory"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="Parallel worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Overwrite existing segment indexes"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
+
+    recordings: List[Tuple[Path, Path]] = find_recordings(Path(args.directory))
+    durations: Dict[Path, Dict[str, Dict[int, float]]] = {
+        metadata: read_durations(metadata) for metadata in {m for _, m in recordings}
+    }
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(resegment, path, durations[metadata], args.force): path
+            for path, metadata in recordings
+        }
+        for future in as_completed(futures):
+            try:
+                logging.info(future.result())
+            except Exception as e:
+                logging.error(f"{futures[future].name}: {e}")
+    logging.info(f"Processed {len(recordings)} recordings")
+
+
+if __name__ == "__main__":
+    main()
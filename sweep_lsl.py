@@ -6,25 +6,145 @@ Usage: python sweep_lsl.py  -m config/sweep_dev.yaml -d config/dev_lsl_stream.ya
 """
 
 import argparse
+import contextlib
 import logging
+import queue
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import csv
+import json
+import os
+import numpy as np
 import serial
+import serial.tools.list_ports
 import sys
 import yaml
-from pylsl import StreamInlet, resolve_stream
+from pylsl import (
+    IRREGULAR_RATE,
+    StreamInfo,
+    StreamInlet,
+    StreamOutlet,
+    TimeoutError as LSLTimeoutError,
+    cf_double64,
+    cf_float32,
+    cf_int8,
+    cf_int16,
+    cf_int32,
+    cf_int64,
+    local_clock,
+    proc_clocksync,
+    proc_dejitter,
+    proc_monotonize,
+    proc_threadsafe,
+    resolve_stream,
+)
 
 # --- CONSTANTS ---
 RANDOM_SEED: int = 42
 SERIAL_BAUDRATE: int = 115200
 SERIAL_TIMEOUT_SEC: float = 0.1
+SERIAL_COMMAND_DELAY_SEC: float = 0.05  # Fixed wait after each command ("sleep" protocol)
+SERIAL_ACK_TIMEOUT_SEC: float = 0.5  # Max wait for the VHP's echo ("ack" protocol)
+SERIAL_PROTOCOLS: Tuple[str, ...] = ("sleep", "ack")
+# The VHP answers a command with "OK <command>" (or a bare echo of it), and
+# rejects it with "ERR <reason>: <command>"
+SERIAL_ACK_PREFIX: str = "OK "
+SERIAL_REJECT_PREFIX: str = "ERR"
+# Wait after opening when no readiness banner is configured; with a banner,
+# the longest wait for it from a VHP that stays silent (already booted)
+SERIAL_STARTUP_DELAY_SEC: float = 2.0
+SERIAL_READY_TIMEOUT_SEC: float = 5.0  # Max wait for the banner from a VHP that is booting
+VHP_POLL_INTERVAL_SEC: float = 0.05  # Port enumeration interval while waiting for the VHP
+# Upper bin edges (ms) of the command round-trip histogram in the metadata
+LATENCY_HISTOGRAM_EDGES_MS: List[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500]
 DEFAULT_STREAM_NAME: str = "SynAmpsRT"
+DEFAULT_MARKER_STREAM_NAME: str = "VHPMarkers"
+VHP_LOG_SUFFIX: str = "_vhp_log.csv"  # Timestamped lines received from the VHP
+VHP_LOG_HEADER: List[str] = ["Timestamp", "Response"]
+CLOCK_LOG_SUFFIX: str = "_clock.csv"  # Periodic time_correction() samples of the EEG inlet
+CLOCK_LOG_HEADER: List[str] = ["LocalClock", "TimeCorrection"]
+
+# Inlet defaults (pylsl's own); overridable under Board: Inlet: in the device YAML
+INLET_MAX_BUFLEN_SEC: int = 360
+INLET_MAX_CHUNKLEN: int = 0  # 0: use the sender's chunk size
+INLET_PROCESSING_FLAGS: Dict[str, int] = {
+    "clocksync": proc_clocksync,  # Add time_correction() to every timestamp
+    "dejitter": proc_dejitter,  # Smooth timestamps with a regression on the sample index
+    "monotonize": proc_monotonize,  # Force timestamps to be increasing
+    "threadsafe": proc_threadsafe,  # Make the post-processing thread-safe
+}
+CLOCK_SAMPLE_INTERVAL_SEC: float = 5.0  # How often time_correction() is recorded (0 disables)
 EEG_CHANNELS_COUNT: int = 33
 PROGRESS_BAR_LENGTH: int = 30
+WRITER_QUEUE_MAXSIZE: int = 512  # Pulled chunks buffered between acquisition and disk
+PULL_CHUNK_MAX_SAMPLES: int = 4096  # Rows in the preallocated pull buffer
+# How the recorder waits for samples. The acquisition thread always blocks in
+# pull_chunk; block: wait on the ring buffer until samples arrive; poll: sleep
+# one target latency when it is empty. Without the thread: the same, on the inlet
+PULL_MODES: Tuple[str, ...] = ("block", "poll")
+PULL_TARGET_LATENCY_SEC: float = 0.005  # Longest wait for new samples before returning
+RING_BUFFER_SEC: float = 10.0  # Samples the acquisition thread can hold for the recorder
+RECORDING_FORMATS: Tuple[str, ...] = ("csv", "binary")
+BINARY_FORMAT_VERSION: int = 1
+BINARY_DATA_SUFFIX: str = ".f32"  # float32 matrix, samples x channels, C order
+BINARY_TIMESTAMPS_SUFFIX: str = ".ts.f64"  # float64 LSL timestamps, one per sample
+BINARY_HEADER_SUFFIX: str = ".json"
+EVENTS_SUFFIX: str = "_events.csv"  # Sparse marker table written next to each recording
+EVENTS_HEADER: List[str] = ["Sample", "Timestamp", "Code", "Channel", "Frequency", "Volume"]
+RECORDING_LAYOUTS: Tuple[str, ...] = ("combination", "session")
+# duration: each phase lasts its duration from its own start (legacy)
+# deadline: each phase ends on an absolute deadline planned for the whole sweep
+# samples: each phase ends after exactly round(duration * nominal_srate) samples
+TIMING_MODES: Tuple[str, ...] = ("duration", "deadline", "samples")
+PIPELINE_LEAD_SEC: float = 0.3  # Pipelined sweep: stage next parameters this long before OFF ends
+STREAM_STALL_TIMEOUT_SEC: float = 5.0  # No samples for this long aborts a sample-count phase
+# Samples acquired up to this long before a phase starts (serial commands
+# between phases) are kept ahead of it; older ones (operator prompts) are dropped
+PHASE_TRANSITION_MAX_SEC: float = 1.0
+PHASE_END_GRACE_SEC: float = 0.25  # Wait this long past a phase end for its last samples
+GAP_THRESHOLD_PERIODS: float = 1.5  # A sample interval longer than this many periods is a gap
+DEFAULT_LOSS_ALERT_PERCENT: float = 0.1  # Phases dropping more than this are logged as warnings
+SEGMENTS_SUFFIX: str = "_segments.csv"  # Segment index of a session recording
+JOURNAL_SUFFIX: str = "_journal.jsonl"  # Completed sweep units, for --resume
+SEGMENTS_HEADER: List[str] = [
+    "Section",
+    "Phase",
+    "Code",
+    "Channel",
+    "Frequency",
+    "Volume",
+    "Cycle",
+    "StartSample",
+    "EndSample",
+    "StartTimestamp",
+    "EndTimestamp",
+    "ByteOffset",
+]
+
+# Phase recorded after each marker code
+PHASE_NAMES: Dict[int, str] = {
+    3: "vhp_off",
+    33: "stim_off",
+    31: "stim_on_no_contact",
+    333: "baseline3",
+    0: "rest",
+    1: "on",
+    11: "off",
+}
+
+# NumPy dtype matching each LSL channel format, for pull_chunk's dest_obj
+LSL_FORMAT_DTYPES: Dict[int, Any] = {
+    cf_float32: np.float32,
+    cf_double64: np.float64,
+    cf_int8: np.int8,
+    cf_int16: np.int16,
+    cf_int32: np.int32,
+    cf_int64: np.int64,
+}
 
 
 def wait_for_space(prompt: str) -> None:
@@ -69,72 +189,514 @@ class Config:
 
         self.board_id: str = str(device["Board"]["Id"])
         self.stream_name: str = device["Board"].get("StreamName", DEFAULT_STREAM_NAME)
+        inlet: Dict[str, Any] = device["Board"].get("Inlet") or {}
+        self.inlet_max_buflen: int = int(inlet.get("MaxBuflen", INLET_MAX_BUFLEN_SEC))
+        self.inlet_max_chunklen: int = int(inlet.get("MaxChunklen", INLET_MAX_CHUNKLEN))
+        self.inlet_processing: List[str] = list(inlet.get("Processing") or [])
+        unknown: List[str] = [f for f in self.inlet_processing if f not in INLET_PROCESSING_FLAGS]
+        if unknown:
+            raise ValueError(
+                f"Unknown inlet processing flags {unknown}; use {list(INLET_PROCESSING_FLAGS)}"
+            )
+        self.clock_interval: float = float(
+            inlet.get("TimeCorrectionInterval", CLOCK_SAMPLE_INTERVAL_SEC)
+        )
+        self.ring_buffer: float = float(inlet.get("RingBuffer", RING_BUFFER_SEC))
 
         self.serial_port: str = device["VHP"]["Serial"]
+        # Set MarkerStream to null in the device YAML to disable the marker outlet
+        self.marker_stream_name: Optional[str] = device["VHP"].get(
+            "MarkerStream", DEFAULT_MARKER_STREAM_NAME
+        )
+        self.serial_protocol: str = device["VHP"].get("Protocol", "sleep")
+        if self.serial_protocol not in SERIAL_PROTOCOLS:
+            raise ValueError(f"VHP Protocol must be one of {SERIAL_PROTOCOLS}")
+        self.ack_timeout: float = float(device["VHP"].get("AckTimeout", SERIAL_ACK_TIMEOUT_SEC))
+        # USB IDs of the VHP's serial adapter, used to detect it without opening the port
+        self.vhp_vid: Optional[int] = device["VHP"].get("Vid")
+        self.vhp_pid: Optional[int] = device["VHP"].get("Pid")
+        self.ready_banner: Optional[str] = device["VHP"].get("ReadyBanner")
+        # Set ResponseStream to publish every line received from the VHP on LSL
+        self.response_stream_name: Optional[str] = device["VHP"].get("ResponseStream")
         self.verbose: int = args.verbose
-        self.timestamp: str = datetime.now().strftime("%y%m%d-%H%M")
+        self.format: str = args.format
+        self.label_column: bool = args.label_column
+        self.layout: str = args.layout
+        self.timing: str = args.timing
+        self.resume: bool = args.resume is not None
+        self.pipeline: bool = args.pipeline
+        self.loss_alert: float = args.loss_alert
+        self.pull_mode: str = args.pull_mode
+        self.pull_latency: float = args.pull_latency / 1000
+        self.timestamp: str = args.resume or datetime.now().strftime("%y%m%d-%H%M")
+
+
+class MarkerOutlet:
+    """
+    LSL marker stream (irregular rate, int32) carrying the sweep's marker codes.
+
+    Markers are stamped with local_clock() when the event happens (e.g. when
+    a stimulation command is written), so they align with the EEG samples to
+    sub-millisecond precision and can be captured by LabRecorder.
+    """
+
+    def __init__(self, name: str, board_id: str) -> None:
+        """
+        Creates the marker outlet.
+
+        Args:
+            name: LSL stream name.
+            board_id: Board identifier, used in the stream's source id.
+        """
+        info = StreamInfo(
+            name=name,
+            type="Markers",
+            channel_count=1,
+            nominal_srate=IRREGULAR_RATE,
+            channel_format="int32",
+            source_id=f"sweep_markers_{board_id}",
+        )
+        self.outlet: StreamOutlet = StreamOutlet(info)
+
+    def push(self, code: int, timestamp: Optional[float] = None) -> float:
+        """
+        Pushes a marker.
+
+        Args:
+            code: Marker code.
+            timestamp: local_clock() time of the event; now if None.
+
+        Returns:
+            The timestamp used.
+        """
+        if timestamp is None:
+            timestamp = local_clock()
+        self.outlet.push_sample([code], timestamp)
+        return timestamp
+
+
+class ResponseOutlet:
+    """LSL marker stream (irregular rate, string) carrying the lines received from the VHP."""
+
+    def __init__(self, name: str, board_id: str) -> None:
+        """
+        Creates the response outlet.
+
+        Args:
+            name: LSL stream name.
+            board_id: Board identifier, used in the stream's source id.
+        """
+        info = StreamInfo(
+            name=name,
+            type="Markers",
+            channel_count=1,
+            nominal_srate=IRREGULAR_RATE,
+            channel_format="string",
+            source_id=f"sweep_vhp_responses_{board_id}",
+        )
+        self.outlet: StreamOutlet = StreamOutlet(info)
+
+    def push(self, response: str, timestamp: float) -> None:
+        """
+        Pushes a received line.
+
+        Args:
+            response: The line, without line terminator.
+            timestamp: local_clock() time at which it was received.
+        """
+        self.outlet.push_sample([response], timestamp)
 
 
 class SerialCommunicator:
-    """Handles serial communication with the VHP device."""
+    """
+    Handles serial communication with the VHP device.
+
+    With the "sleep" protocol every command is followed by a fixed 50 ms
+    wait. With the "ack" protocol the command returns as soon as the VHP
+    echoes it back (or the timeout expires), and the round-trip latency of
+    every command is recorded.
+
+    Channel, volume, frequency and test mode are tracked in a shadow copy of
+    the device state; only parameters that differ from it are sent, batched
+    into a single write.
 
-    def __init__(self, port: str) -> None:
+    A background thread continuously drains the port. Every received line is
+    stamped with local_clock() and kept in `responses`, so device-side events
+    can be aligned with the EEG; writes never wait on reads.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        markers: Optional[MarkerOutlet] = None,
+        protocol: str = "sleep",
+        ack_timeout: float = SERIAL_ACK_TIMEOUT_SEC,
+        ready_banner: Optional[str] = None,
+        response_outlet: Optional[ResponseOutlet] = None,
+    ) -> None:
         """
         Opens a serial connection to the VHP device.
 
         Args:
             port: Serial port name (e.g., 'COM3').
+            markers: Optional marker outlet stamped when stimulation starts/stops.
+            protocol: "sleep" (fixed delay) or "ack" (wait for the echo).
+            ack_timeout: Maximum wait for an acknowledgement in seconds.
+            ready_banner: Text the VHP prints once it has booted. When given,
+                the connection is ready as soon as it arrives instead of after
+                a fixed 2 s wait. A VHP that did not reset on open prints
+                nothing and is considered ready after that same 2 s.
+            response_outlet: Optional outlet receiving every line from the VHP.
         """
         self.port: str = port
+        self.markers: Optional[MarkerOutlet] = markers
+        self.protocol: str = protocol
+        self.ack_timeout: float = ack_timeout
+        self.latencies: List[float] = []  # Round-trip times of acknowledged commands
+        self.ack_timeouts: int = 0
+        self.ack_rejections: int = 0
+        self.response_outlet: Optional[ResponseOutlet] = response_outlet
+        self.responses: List[Tuple[float, str]] = []  # (local_clock() time, line) event log
+        self.reader_error: Optional[BaseException] = None
+        self._lines: "queue.Queue[Tuple[float, str]]" = queue.Queue()  # Lines not yet consumed
+        self._stop_reader: threading.Event = threading.Event()
+        self.state: Dict[str, int] = {}  # Last value sent per parameter command ("C", "V", ...)
+        self.commands_sent: int = 0
+        self.commands_skipped: int = 0
+        self.dead_time_saved: float = 0.0
         self.ser: serial.Serial = serial.Serial(
             port=self.port, baudrate=SERIAL_BAUDRATE, timeout=SERIAL_TIMEOUT_SEC
         )
         if not self.ser.is_open:
             self.ser.open()
-        time.sleep(2)
+        self._reader: threading.Thread = threading.Thread(
+            target=self._read_loop, name="vhp-reader", daemon=True
+        )
+        self._reader.start()
+        if ready_banner is None:
+            time.sleep(SERIAL_STARTUP_DELAY_SEC)
+        else:
+            self._wait_until_ready(ready_banner)
+
+    def _wait_until_ready(self, ready_banner: str) -> None:
+        """
+        Waits for the readiness banner of a VHP that reset when the port was opened.
+
+        A VHP still silent after SERIAL_STARTUP_DELAY_SEC was already running
+        and will print no banner; one that has printed boot messages is given
+        up to SERIAL_READY_TIMEOUT_SEC to finish.
+
+        Args:
+            ready_banner: Text the VHP prints once it has booted.
+        """
+        opened_at: float = local_clock()
+
+        def is_banner(line: str) -> bool:
+            return ready_banner in line
+
+        if self._wait_for_line(is_banner, opened_at + SERIAL_STARTUP_DELAY_SEC):
+            return
+        if not self.responses:
+            logging.info(
+                f"No readiness banner from VHP within {SERIAL_STARTUP_DELAY_SEC}s, "
+                "assuming it was already running"
+            )
+            return
+        if not self._wait_for_line(is_banner, opened_at + SERIAL_READY_TIMEOUT_SEC):
+            logging.warning(f"No readiness banner from VHP within {SERIAL_READY_TIMEOUT_SEC}s")
 
     def __del__(self) -> None:
         """Closes the serial connection upon object destruction."""
+        self.close()
+
+    def close(self) -> None:
+        """Stops the reader thread and closes the serial connection."""
+        if hasattr(self, "_reader"):
+            self._stop_reader.set()
+            self._reader.join()
         if hasattr(self, "ser") and self.ser.is_open:
             self.ser.close()
             logging.info("Serial connection closed.")
 
-    def _send_command(self, command: str) -> None:
+    def _read_loop(self) -> None:
+        """Reader thread body: stamps, logs and publishes every received line."""
+        partial: bytes = b""
+        while not self._stop_reader.is_set():
+            try:
+                partial += self.ser.readline()
+            except (serial.SerialException, OSError) as e:
+                self.reader_error = e
+                logging.error(f"Serial read from VHP failed: {e}")
+                return
+            if not partial.endswith(b"\n"):
+                continue  # Timed out, possibly mid-line; keep the partial line
+            received_at: float = local_clock()
+            response: str = partial.decode("utf-8", errors="ignore").strip()
+            partial = b""
+            logging.debug("Serial VHP Received: %s", response)
+            self.responses.append((received_at, response))
+            if self.response_outlet is not None:
+                self.response_outlet.push(response, received_at)
+            self._lines.put((received_at, response))
+
+    def _send_command(self, command: str, marker: Optional[int] = None) -> float:
         """
         Sends a command via serial and logs responses.
 
         Args:
             command: The command string to send.
+            marker: Optional marker code pushed when the command has been written.
+
+        Returns:
+            The local_clock() time at which the command was written.
         """
-        self.ser.write((command + "\n").encode("utf-8"))
-        time.sleep(0.05)
-        while self.ser.in_waiting > 0:
-            response = self.ser.readline().decode("utf-8", errors="ignore").strip()
-            logging.debug("Serial VHP Received: %s", response)
+        sent_at, _ = self._send_commands([command], marker)
+        return sent_at
+
+    def _send_commands(
+        self, commands: List[str], marker: Optional[int] = None
+    ) -> Tuple[float, List[bool]]:
+        """
+        Sends several commands in a single write and logs responses.
+
+        Args:
+            commands: The command strings to send, in order.
+            marker: Optional marker code pushed when the commands have been written.
+
+        Returns:
+            A tuple (sent_at, acknowledged): the local_clock() time of the
+            write and, per command, whether the VHP acknowledged it (always
+            True with the "sleep" protocol).
+        """
+        if self.protocol == "ack":
+            # Anything left over predates these commands and cannot be their echo
+            self._drain_responses()
+
+        # Round trips are measured from before the write: the reader thread may
+        # receive an echo before flush() returns
+        issued_at: float = local_clock()
+        self.ser.write("".join(command + "\n" for command in commands).encode("utf-8"))
+        self.ser.flush()
+        sent_at: float = local_clock()
+        self.commands_sent += len(commands)
+        if marker is not None and self.markers is not None:
+            self.markers.push(marker, sent_at)
+
+        if self.protocol == "ack":
+            # The VHP handles commands in order, so the echoes arrive in order too
+            return sent_at, [self._wait_for_ack(command, issued_at) for command in commands]
+        time.sleep(SERIAL_COMMAND_DELAY_SEC)
+        self._drain_responses()
+        return sent_at, [True] * len(commands)
+
+    def _drain_responses(self) -> None:
+        """Discards lines received so far (they remain in the event log)."""
+        with contextlib.suppress(queue.Empty):
+            while True:
+                self._lines.get_nowait()
+
+    def _wait_for_ack(self, command: str, sent_at: float) -> bool:
+        """
+        Waits until the VHP acknowledges or rejects `command`, recording the round trip.
+
+        Only a line equal to the echo ("OK <command>" or "<command>") counts
+        as an acknowledgement; "ERR ...: <command>" is a rejection. Other
+        lines (unsolicited device messages) are skipped.
+
+        Args:
+            command: The command that was sent.
+            sent_at: local_clock() time just before it was written.
+
+        Returns:
+            True if the acknowledgement arrived before the timeout, False if
+            the command was rejected or timed out.
+        """
+
+        def answers(line: str) -> bool:
+            if line in (command, SERIAL_ACK_PREFIX + command):
+                return True
+            return line.startswith(SERIAL_REJECT_PREFIX) and line.rsplit(" ", 1)[-1] == command
+
+        answer: Optional[Tuple[float, str]] = self._wait_for_line(
+            answers, sent_at + self.ack_timeout
+        )
+        if answer is None:
+            self.ack_timeouts += 1
+            logging.warning(
+                f"No acknowledgement from VHP for '{command}' within {self.ack_timeout}s"
+            )
+            return False
+        received_at, response = answer
+        if response.startswith(SERIAL_REJECT_PREFIX):
+            self.ack_rejections += 1
+            logging.warning(f"VHP rejected '{command}': {response}")
+            return False
+        self.latencies.append(received_at - sent_at)
+        return True
+
+    def _wait_for_line(
+        self, matches: Callable[[str], bool], deadline: float
+    ) -> Optional[Tuple[float, str]]:
+        """
+        Consumes received lines until one matches.
+
+        Args:
+            matches: Returns True for the line to wait for.
+            deadline: local_clock() time at which to give up.
+
+        Returns:
+            A tuple (local_clock() time at which the line was received, line),
+            or None if no matching line arrived before the deadline.
+        """
+        while (remaining := deadline - local_clock()) > 0:
+            try:
+                received_at, response = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if matches(response):
+                return received_at, response
+        return None
+
+    def write_log(self, path: Path, append: bool = False) -> None:
+        """
+        Writes the timestamped lines received from the VHP to a CSV file.
+
+        Args:
+            path: Output file.
+            append: Append to an existing log (resumed sweep).
+        """
+        new_file: bool = not (append and path.exists())
+        with open(path, "w" if new_file else "a", newline="") as f:
+            log = csv.writer(f)
+            if new_file:
+                log.writerow(VHP_LOG_HEADER)
+            log.writerows(list(self.responses))
+
+    def latency_summary(self) -> List[str]:
+        """Returns round-trip latency statistics and a histogram as report lines."""
+        if self.protocol != "ack":
+            return [f"Protocol: sleep ({SERIAL_COMMAND_DELAY_SEC * 1000:.0f} ms fixed delay)"]
+        lines: List[str] = [
+            f"Protocol: ack (timeout {self.ack_timeout * 1000:.0f} ms)",
+            f"Commands acknowledged: {len(self.latencies)}, rejected: {self.ack_rejections}, "
+            f"timed out: {self.ack_timeouts}",
+        ]
+        if not self.latencies:
+            return lines
+        ms: np.ndarray = np.asarray(self.latencies) * 1000
+        lines.append(
+            f"Round trip: min={ms.min():.2f} ms, median={np.median(ms):.2f} ms, "
+            f"p95={np.percentile(ms, 95):.2f} ms, max={ms.max():.2f} ms"
+        )
+        edges: List[float] = [0.0] + LATENCY_HISTOGRAM_EDGES_MS + [np.inf]
+        counts, _ = np.histogram(ms, bins=edges)
+        for low, high, count in zip(edges[:-1], edges[1:], counts):
+            label: str = f">= {low:g} ms" if np.isinf(high) else f"{low:g}-{high:g} ms"
+            lines.append(f"  {label:>12}: {count}")
+        return lines
+
+    def _command_cost(self) -> float:
+        """Returns the typical blocking time of one separately sent command in seconds."""
+        if self.protocol == "ack":
+            return float(np.median(self.latencies)) if self.latencies else 0.0
+        return SERIAL_COMMAND_DELAY_SEC
+
+    def set_parameters(
+        self,
+        channel: Optional[int] = None,
+        volume: Optional[int] = None,
+        frequency: Optional[int] = None,
+        test_mode: Optional[bool] = None,
+    ) -> None:
+        """
+        Sends the parameters that differ from the cached device state.
+
+        Changed parameters go out as one batched write; unchanged ones are
+        skipped. A parameter the VHP did not acknowledge is dropped from the
+        cache so it is sent again next time.
+
+        Args:
+            channel: VHP channel, None to leave unchanged.
+            volume: VHP volume, None to leave unchanged.
+            frequency: VHP stimulation frequency, None to leave unchanged.
+            test_mode: VHP test mode, None to leave unchanged.
+        """
+        wanted: Dict[str, int] = {}
+        if channel is not None:
+            wanted["C"] = max(0, min(8, channel))
+        if volume is not None:
+            wanted["V"] = max(0, min(100, volume))
+        if frequency is not None:
+            wanted["F"] = frequency
+        if test_mode is not None:
+            wanted["M"] = 1 if test_mode else 0
+
+        changed: Dict[str, int] = {
+            key: value for key, value in wanted.items() if self.state.get(key) != value
+        }
+        self.commands_skipped += len(wanted) - len(changed)
+        # Without the cache every parameter was a separate, blocking command
+        cost_before: float = len(wanted) * self._command_cost()
+        if not changed:
+            self.dead_time_saved += cost_before
+            return
+
+        start: float = time.perf_counter()
+        _, acknowledged = self._send_commands([f"{key}{value}" for key, value in changed.items()])
+        for (key, value), ok in zip(changed.items(), acknowledged):
+            if ok:
+                self.state[key] = value
+            else:
+                self.state.pop(key, None)
+        self.dead_time_saved += max(0.0, cost_before - (time.perf_counter() - start))
 
     def set_channel(self, channel: int) -> None:
         """Sets the VHP channel."""
-        self._send_command(f"C{max(0, min(8, channel))}")
+        self.set_parameters(channel=channel)
 
     def set_volume(self, volume: int) -> None:
         """Sets the VHP volume."""
-        self._send_command(f"V{max(0, min(100, volume))}")
+        self.set_parameters(volume=volume)
 
     def set_frequency(self, frequency: int) -> None:
         """Sets the VHP stimulation frequency."""
-        self._send_command(f"F{frequency}")
+        self.set_parameters(frequency=frequency)
 
     def set_test_mode(self, enabled: bool) -> None:
         """Enables or disables VHP test mode."""
-        self._send_command(f"M{1 if enabled else 0}")
+        self.set_parameters(test_mode=enabled)
+
+    def parameter_summary(self) -> List[str]:
+        """Returns parameter update statistics as report lines."""
+        return [
+            f"Commands sent: {self.commands_sent}",
+            f"Parameter commands skipped (unchanged): {self.commands_skipped}",
+            f"Serial dead time saved: {self.dead_time_saved:.2f} s",
+        ]
 
-    def start_stream(self) -> None:
-        """Starts the VHP stimulation stream."""
-        self._send_command("1")
+    def start_stream(self, marker: int = 1) -> float:
+        """
+        Starts the VHP stimulation stream.
 
-    def stop_stream(self) -> None:
-        """Stops the VHP stimulation stream."""
-        self._send_command("0")
+        Args:
+            marker: Marker code pushed to the marker outlet.
+
+        Returns:
+            The local_clock() time at which the command was written.
+        """
+        return self._send_command("1", marker)
+
+    def stop_stream(self, marker: int = 11) -> float:
+        """
+        Stops the VHP stimulation stream.
+
+        Args:
+            marker: Marker code pushed to the marker outlet.
+
+        Returns:
+            The local_clock() time at which the command was written.
+        """
+        return self._send_command("0", marker)
 
 
 def parse_yaml_file(file_path: Union[str, Path]) -> Dict[str, Any]:
@@ -174,6 +736,71 @@ def parse_cmdline() -> Tuple[argparse.Namespace, Config]:
     parser.add_argument(
         "-v", "--verbose", action="count", default=0, help="Verbose level up to 5"
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=RECORDING_FORMATS,
+        default="csv",
+        help="Recording format: csv (text) or binary (float32 data + float64 timestamps)",
+    )
+    parser.add_argument(
+        "-l",
+        "--layout",
+        choices=RECORDING_LAYOUTS,
+        default="combination",
+        help="combination: one file per combination and baseline; "
+        "session: one continuous recording with a segment index",
+    )
+    parser.add_argument(
+        "-t",
+        "--timing",
+        choices=TIMING_MODES,
+        default="duration",
+        help="duration: each phase runs for its duration from its own start; "
+        "deadline: phases end on absolute deadlines planned for the whole sweep; "
+        "samples: phases end after exactly duration x nominal rate samples",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="TIMESTAMP",
+        help="Resume an interrupted sweep (e.g. 250114-0930): skips baselines 1 and 2 "
+        "and every unit already in its journal",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Send the next combination's parameters during the last OFF phase "
+        "of the previous one, so Baseline 3 starts without a serial gap",
+    )
+    parser.add_argument(
+        "--pull-mode",
+        choices=PULL_MODES,
+        default="block",
+        help=(
+            "How the recorder waits for new samples from the acquisition thread "
+            "(which always blocks in pull_chunk): block: until they arrive; "
+            "poll: sleep one target latency when none are buffered"
+        ),
+    )
+    parser.add_argument(
+        "--pull-latency",
+        type=float,
+        default=PULL_TARGET_LATENCY_SEC * 1000,
+        metavar="MS",
+        help="Target chunk latency: longest wait for new samples (higher saves CPU and wakeups)",
+    )
+    parser.add_argument(
+        "--loss-alert",
+        type=float,
+        default=DEFAULT_LOSS_ALERT_PERCENT,
+        metavar="PERCENT",
+        help="Log a warning when a phase drops more than this percentage of its samples",
+    )
+    parser.add_argument(
+        "--label-column",
+        action="store_true",
+        help="Also write markers to a Label column in CSV files (legacy layout)",
+    )
     args = parser.parse_args()
     return args, Config(
         parse_yaml_file(args.measureconf), parse_yaml_file(args.deviceconf), args
@@ -185,23 +812,37 @@ def parse_cmdline() -> Tuple[argparse.Namespace, Config]:
 # --------------------------------------------------------------------
 
 
-def setup_lsl_inlet(stream_name: str = DEFAULT_STREAM_NAME) -> StreamInlet:
+def setup_lsl_inlet(
+    stream_name: str = DEFAULT_STREAM_NAME,
+    max_buflen: int = INLET_MAX_BUFLEN_SEC,
+    max_chunklen: int = INLET_MAX_CHUNKLEN,
+    processing: Optional[List[str]] = None,
+) -> StreamInlet:
     """
     Resolves an LSL stream by name and sets up an inlet.
 
     Args:
         stream_name: The name of the LSL stream to connect to.
+        max_buflen: Seconds of data liblsl buffers before dropping the oldest.
+        max_chunklen: Preferred chunk size in samples (0: sender's chunk size).
+        processing: Timestamp post-processing flags (keys of INLET_PROCESSING_FLAGS).
 
     Returns:
         The established StreamInlet object.
     """
     logging.info(f"Resolving LSL stream: {stream_name}")
     streams = resolve_stream("name", stream_name)
-    inlet = StreamInlet(streams[0])
+    flags: int = 0
+    for name in processing or []:
+        flags |= INLET_PROCESSING_FLAGS[name]
+    inlet = StreamInlet(
+        streams[0], max_buflen=max_buflen, max_chunklen=max_chunklen, processing_flags=flags
+    )
     info = inlet.info()
     logging.info(
         f"Connected to LSL stream: {info.name()} ({info.channel_count()} "
-        f"ch @ {info.nominal_srate()} Hz)"
+        f"ch @ {info.nominal_srate()} Hz), buffer {max_buflen}s, chunk {max_chunklen or 'auto'}, "
+        f"processing: {', '.join(processing or []) or 'none'}"
     )
     return inlet
 
@@ -209,79 +850,1472 @@ def setup_lsl_inlet(stream_name: str = DEFAULT_STREAM_NAME) -> StreamInlet:
 # --------------------------------------------------------------------
 # Recording Functions
 # --------------------------------------------------------------------
+
+
+class SampleLossMonitor:
+    """
+    Detects dropped samples from gaps in a regularly sampled stream.
+
+    Every chunk is checked as it is pulled: sample intervals longer than
+    GAP_THRESHOLD_PERIODS / nominal_srate are gaps, and each gap accounts for
+    round(interval * nominal_srate) - 1 dropped samples. Recording functions
+    bracket each phase with begin_phase/end_phase to get a per-segment
+    summary of expected vs. received samples.
+    """
+
+    def __init__(
+        self, nominal_srate: float, alert_percent: float = DEFAULT_LOSS_ALERT_PERCENT
+    ) -> None:
+        """
+        Initializes the counters.
+
+        Args:
+            nominal_srate: Nominal sample rate of the stream (0 disables detection).
+            alert_percent: Dropped percentage of a phase above which a warning is logged.
+        """
+        self.nominal_srate: float = nominal_srate
+        self.alert_percent: float = alert_percent
+        self.last_timestamp: Optional[float] = None
+        self.gaps: int = 0
+        self.dropped: int = 0
+        self.largest_gap: float = 0.0
+        self.phase: Optional[Dict[str, Any]] = None
+        self.phases: List[Dict[str, Any]] = []
+
+    def update(self, timestamps: np.ndarray) -> None:
+        """
+        Checks newly pulled samples for gaps (vectorized over the chunk).
+
+        Args:
+            timestamps: Timestamps of the samples, in acquisition order.
+        """
+        if self.nominal_srate <= 0 or not len(timestamps):
+            return
+        if self.last_timestamp is None:
+            intervals: np.ndarray = np.diff(timestamps)
+        else:
+            intervals = np.diff(timestamps, prepend=self.last_timestamp)
+        self.last_timestamp = float(timestamps[-1])
+
+        gaps: np.ndarray = intervals[intervals * self.nominal_srate > GAP_THRESHOLD_PERIODS]
+        if not gaps.size:
+            return
+        dropped: int = int(np.round(gaps * self.nominal_srate).sum()) - gaps.size
+        largest: float = float(gaps.max())
+        self.gaps += gaps.size
+        self.dropped += dropped
+        self.largest_gap = max(self.largest_gap, largest)
+        if self.phase is not None:
+            self.phase["dropped"] += dropped
+            self.phase["largest_gap"] = max(self.phase["largest_gap"], largest)
+
+    def begin_phase(
+        self, code: Optional[Union[int, float, str]], expected: int, context: Dict[str, Any]
+    ) -> None:
+        """
+        Starts the summary of one recorded phase.
+
+        Args:
+            code: The phase's marker code.
+            expected: Samples the phase should contain at the nominal rate.
+            context: Recording context (section, channel, frequency, volume, cycle).
+        """
+        self.phase = {
+            "code": code,
+            "context": dict(context),
+            "expected": expected,
+            "received": 0,
+            "dropped": 0,
+            "largest_gap": 0.0,
+        }
+
+    def skip(self, samples: int) -> None:
+        """
+        Accounts for samples overwritten in the ring buffer before being read.
+
+        They were acquired, so they do not count as a gap in the stream; if a
+        phase is open they are lost to it all the same.
+
+        Args:
+            samples: Number of overwritten samples.
+        """
+        self.last_timestamp = None
+        if self.phase is not None:
+            self.phase["dropped"] += samples
+            self.dropped += samples
+
+    def count(self, samples: int) -> None:
+        """Adds samples written to the current phase."""
+        if self.phase is not None:
+            self.phase["received"] += samples
+
+    def end_phase(self) -> None:
+        """
+        Closes the current phase summary and logs an alert if it lost too much.
+
+        A phase counts as missing whatever it dropped in gaps or, if more,
+        whatever it received short of its expected count: a stream that
+        stalls or a phase that starts late leaves no gap.
+        """
+        phase: Optional[Dict[str, Any]] = self.phase
+        self.phase = None
+        if phase is None:
+            return
+        self.phases.append(phase)
+        missing: int = max(phase["dropped"], phase["expected"] - phase["received"])
+        lost: float = missing / max(1, phase["expected"]) * 100
+        if lost > self.alert_percent:
+            logging.warning(
+                f"Sample loss in {self.describe(phase)}: {missing} samples missing "
+                f"({lost:.2f}%), received {phase['received']} of {phase['expected']}, "
+                f"{phase['dropped']} dropped in gaps, "
+                f"largest gap {phase['largest_gap'] * 1000:.1f} ms"
+            )
+
+    @staticmethod
+    def describe(phase: Dict[str, Any]) -> str:
+        """Returns a short label for a phase summary."""
+        context: Dict[str, Any] = phase["context"]
+        label: str = f"{context.get('section', '')} {PHASE_NAMES.get(phase['code'], phase['code'])}"
+        for key, prefix in (("channel", "c"), ("frequency", "f"), ("volume", "v")):
+            if context.get(key) is not None:
+                label += f" {prefix}{context[key]}"
+        if context.get("cycle") is not None:
+            label += f" cycle {context['cycle']}"
+        return label.strip()
+
+    def summary(self) -> List[str]:
+        """Returns per-segment and total loss statistics as report lines."""
+        if self.nominal_srate <= 0:
+            return ["Irregular-rate stream: gap detection disabled"]
+        lines: List[str] = [
+            f"Total: {self.dropped} samples dropped in {self.gaps} gaps, "
+            f"largest gap {self.largest_gap * 1000:.1f} ms "
+            f"(gap: interval > {GAP_THRESHOLD_PERIODS} x 1/{self.nominal_srate:g} s)"
+        ]
+        for phase in self.phases:
+            lines.append(
+                f"{self.describe(phase)}: expected {phase['expected']}, "
+                f"received {phase['received']}, dropped {phase['dropped']}, "
+                f"largest gap {phase['largest_gap'] * 1000:.1f} ms"
+            )
+        return lines
+
+
+class ChunkPuller:
+    """
+    Pulls LSL chunks into a reused, preallocated NumPy buffer.
+
+    pylsl builds a Python list per sample and per channel unless pull_chunk
+    is given a destination buffer; filling one buffer in place avoids those
+    allocations entirely.
+
+    After start(), an acquisition thread owns the inlet and pulls
+    continuously, including during operator prompts and serial commands,
+    into a ring buffer of ring_seconds; pull_block then reads from the ring.
+    Without start() the inlet is pulled directly.
+    """
+
+    def __init__(
+        self,
+        inlet: StreamInlet,
+        max_samples: int = PULL_CHUNK_MAX_SAMPLES,
+        loss_alert_percent: float = DEFAULT_LOSS_ALERT_PERCENT,
+        clock_interval: float = 0.0,
+        clock_synced: bool = False,
+        mode: str = "block",
+        target_latency: float = PULL_TARGET_LATENCY_SEC,
+        ring_seconds: float = RING_BUFFER_SEC,
+    ) -> None:
+        """
+        Allocates the pull buffer for the inlet's channel count and format.
+
+        Args:
+            inlet: The LSL stream inlet.
+            max_samples: Maximum number of samples returned by a single pull.
+            loss_alert_percent: See SampleLossMonitor.
+            clock_interval: Seconds between recorded time_correction() samples (0 disables).
+            clock_synced: The inlet applies clocksync, so timestamps are already
+                on the local clock.
+            mode: How wait_block waits for samples (see PULL_MODES).
+            target_latency: Longest wait for new samples in seconds.
+            ring_seconds: Capacity of the acquisition thread's ring buffer in seconds.
+        """
+        info = inlet.info()
+        channel_format: int = info.channel_format()
+        if channel_format not in LSL_FORMAT_DTYPES:
+            raise ValueError(f"Unsupported LSL channel format: {channel_format}")
+
+        self.inlet: StreamInlet = inlet
+        self.max_samples: int = max_samples
+        self.stream_name: str = info.name()
+        self.nominal_srate: float = info.nominal_srate()
+        self.channel_count: int = min(info.channel_count(), EEG_CHANNELS_COUNT)
+        self.buffer: np.ndarray = np.zeros(
+            (max_samples, info.channel_count()), dtype=LSL_FORMAT_DTYPES[channel_format]
+        )
+        self.carry: Optional[np.ndarray] = None
+        self.loss: SampleLossMonitor = SampleLossMonitor(self.nominal_srate, loss_alert_percent)
+        self.clock_interval: float = clock_interval
+        self.clock_synced: bool = clock_synced
+        self.clock_offsets: List[Tuple[float, float]] = []  # (local_clock(), time_correction())
+        self.next_clock_sample: float = 0.0
+        self.mode: str = mode
+        self.target_latency: float = target_latency
+        # A blocking pull returns once this many samples (one target latency) are in
+        self.target_chunk: int = (
+            max(1, min(max_samples, round(target_latency * self.nominal_srate)))
+            if self.nominal_srate > 0
+            else 1
+        )
+        self.wakeups: int = 0
+        self.cpu_start: os.times_result = os.times()
+        self.wall_start: float = time.perf_counter()
+
+        # Ring buffer filled by the acquisition thread (allocated by start())
+        self.ring_seconds: float = ring_seconds
+        self.ring: Optional[np.ndarray] = None
+        self.ring_start: int = 0
+        self.ring_count: int = 0
+        self.ring_peak: int = 0
+        self.overflowed: int = 0
+        self.overflow_unread: int = 0
+        self.discarded: int = 0
+        self.acquisition_wakeups: int = 0
+        self.acquisition_error: Optional[BaseException] = None
+        self.ring_ready = threading.Condition()
+        self._stop_acquisition = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts the acquisition thread.
+
+        From here on the thread is the only user of the inlet: samples are
+        acquired whether or not a phase is being recorded, and the recording
+        functions claim them by timestamp.
+        """
+        if not self.clock_offsets:
+            self.sample_clock(timeout=2.0)  # stream_time() needs one offset estimate
+        capacity: int = (
+            round(self.ring_seconds * self.nominal_srate) if self.nominal_srate > 0 else 0
+        )
+        self.ring = np.empty((max(self.max_samples, capacity), 1 + self.channel_count))
+        self.thread = threading.Thread(target=self._acquire, name="lsl-acquisition", daemon=True)
+        self.thread.start()
+        logging.info(
+            f"Acquisition thread started (ring buffer {self.ring.shape[0]} samples)"
+        )
+
+    def stop(self) -> None:
+        """Stops the acquisition thread; samples still in the ring can be read."""
+        if self.thread is None:
+            return
+        self._stop_acquisition.set()
+        self.thread.join()
+        self.thread = None
+
+    def _acquire(self) -> None:
+        """Acquisition thread: pulls the inlet into the ring buffer until stopped."""
+        try:
+            while not self._stop_acquisition.is_set():
+                if self.clock_interval > 0 and time.monotonic() >= self.next_clock_sample:
+                    self.sample_clock()
+                self.acquisition_wakeups += 1
+                # Everything already buffered, else block until one target
+                # latency worth of samples is in
+                block: np.ndarray = self._pull_inlet(0.0, self.max_samples)
+                if not block.shape[0]:
+                    block = self._pull_inlet(self.target_latency, self.target_chunk)
+                if block.shape[0]:
+                    self._ring_write(block)
+        except Exception as e:
+            logging.error(f"LSL acquisition stopped: {e}")
+            self.acquisition_error = e
+            with self.ring_ready:
+                self.ring_ready.notify_all()
+
+    def _pull_inlet(self, timeout: float, max_samples: int) -> np.ndarray:
+        """Pulls one chunk from the inlet as a new [timestamp + EEG channels] block."""
+        _, timestamps = self.inlet.pull_chunk(
+            timeout=timeout, max_samples=max_samples, dest_obj=self.buffer
+        )
+        n: int = len(timestamps)
+        block: np.ndarray = np.empty((n, 1 + self.channel_count), dtype=np.float64)
+        block[:, 0] = timestamps
+        block[:, 1:] = self.buffer[:n, : self.channel_count]
+        return block
+
+    def _ring_write(self, block: np.ndarray) -> None:
+        """Appends a block to the ring, overwriting the oldest samples when full."""
+        capacity: int = self.ring.shape[0]
+        with self.ring_ready:
+            dropped: int = max(0, self.ring_count + block.shape[0] - capacity)
+            if dropped:
+                block = block[-capacity:]
+                overwritten: int = min(dropped, self.ring_count)
+                self.ring_start = (self.ring_start + overwritten) % capacity
+                self.ring_count -= overwritten
+                self.overflowed += dropped
+                self.overflow_unread += dropped
+            end: int = (self.ring_start + self.ring_count) % capacity
+            first: int = min(block.shape[0], capacity - end)
+            self.ring[end : end + first] = block[:first]
+            self.ring[: block.shape[0] - first] = block[first:]
+            self.ring_count += block.shape[0]
+            self.ring_peak = max(self.ring_peak, self.ring_count)
+            self.ring_ready.notify_all()
+
+    def _ring_read(self, timeout: float, max_samples: int) -> np.ndarray:
+        """Waits up to timeout for max_samples to be in, then takes what the ring holds."""
+        capacity: int = self.ring.shape[0]
+        with self.ring_ready:
+            if timeout > 0:
+                self.ring_ready.wait_for(
+                    lambda: self.ring_count >= max_samples or self.acquisition_error is not None,
+                    timeout,
+                )
+            if self.acquisition_error is not None and not self.ring_count:
+                raise RuntimeError(f"LSL acquisition failed: {self.acquisition_error}")
+            n: int = min(self.ring_count, self.max_samples)
+            first: int = min(n, capacity - self.ring_start)
+            block: np.ndarray = np.empty((n, self.ring.shape[1]))
+            block[:first] = self.ring[self.ring_start : self.ring_start + first]
+            block[first:] = self.ring[: n - first]
+            self.ring_start = (self.ring_start + n) % capacity
+            self.ring_count -= n
+            overflowed: int = self.overflow_unread
+            self.overflow_unread = 0
+        if overflowed:
+            if self.loss.phase is not None:
+                logging.warning(f"Ring buffer overflow: {overflowed} samples were overwritten")
+            self.loss.skip(overflowed)
+        return block
+
+    def pull_block(self, timeout: float = 0.0, max_samples: Optional[int] = None) -> np.ndarray:
+        """
+        Pulls available samples as a [timestamp + EEG channels] block.
+        Samples handed back with unread() come first.
+
+        Args:
+            timeout: Seconds to wait for samples (pull_chunk timeout).
+            max_samples: Return once this many samples are in (default: buffer size).
+
+        Returns:
+            A new float64 array of shape (n, 1 + channels); n may be 0.
+        """
+        carry: Optional[np.ndarray] = self.carry
+        self.carry = None
+        if carry is not None:
+            timeout = 0.0
+        if self.thread is not None:
+            block: np.ndarray = self._ring_read(timeout, max_samples or self.max_samples)
+        else:
+            if self.clock_interval > 0 and time.monotonic() >= self.next_clock_sample:
+                self.sample_clock()
+            block = self._pull_inlet(timeout, max_samples or self.max_samples)
+        self.loss.update(block[:, 0])  # Fresh samples only; the carry was checked already
+        return block if carry is None else np.concatenate((carry, block))
+
+    def wait_block(self, remaining: float) -> np.ndarray:
+        """
+        Returns the samples available now or, if there are none, waits for more.
+
+        The wait never exceeds the target latency or `remaining`. In block
+        mode it returns as soon as one target latency worth of samples has
+        arrived (in the ring buffer, or inside pull_chunk without the
+        acquisition thread); in poll mode it is a sleep.
+
+        Args:
+            remaining: Seconds left until the caller's deadline.
+
+        Returns:
+            A block as returned by pull_block; it may be empty.
+        """
+        self.wakeups += 1
+        block: np.ndarray = self.pull_block(timeout=0.0)
+        if block.shape[0] or remaining <= 0:
+            return block
+        wait: float = min(self.target_latency, remaining)
+        if self.mode == "poll":
+            time.sleep(wait)
+            return block
+        return self.pull_block(timeout=wait, max_samples=self.target_chunk)
+
+    def pull_summary(self) -> List[str]:
+        """Returns process CPU use and acquisition wakeups as report lines."""
+        now: os.times_result = os.times()
+        wall: float = max(1e-9, time.perf_counter() - self.wall_start)
+        cpu: float = (now.user - self.cpu_start.user) + (now.system - self.cpu_start.system)
+        lines: List[str] = [
+            f"Pull mode: {self.mode}, target latency {self.target_latency * 1000:g} ms "
+            f"({self.target_chunk} samples)",
+            f"Wakeups: {self.wakeups / wall:.1f}/s, process CPU: {cpu / wall * 100:.1f}% "
+            f"over {wall:.0f} s",
+        ]
+        if self.ring is not None:
+            rate: float = self.nominal_srate if self.nominal_srate > 0 else 1.0
+            unit: str = "s" if self.nominal_srate > 0 else "samples"
+            lines += [
+                f"Acquisition thread: {self.acquisition_wakeups / wall:.1f} wakeups/s, "
+                f"ring buffer {self.ring.shape[0] / rate:g} {unit}, "
+                f"peak fill {self.ring_peak / rate:.2f} {unit}",
+                f"Overwritten in ring buffer: {self.overflowed} samples, "
+                f"discarded before phases: {self.discarded} samples",
+            ]
+        return lines
+
+    def unread(self, block: np.ndarray) -> None:
+        """Hands samples back so the next pull_block returns them first."""
+        if block.shape[0]:
+            self.carry = block if self.carry is None else np.concatenate((self.carry, block))
+
+    def sample_clock(self, timeout: float = 0.0) -> None:
+        """
+        Records one time_correction() sample.
+
+        liblsl refreshes the estimate in the background, so once the first
+        one is available (see the timeout) this does not block.
+
+        Args:
+            timeout: Seconds to wait for an estimate.
+        """
+        self.next_clock_sample = time.monotonic() + self.clock_interval
+        try:
+            offset: float = self.inlet.time_correction(timeout=timeout)
+        except LSLTimeoutError:
+            return
+        self.clock_offsets.append((local_clock(), offset))
+
+    def write_clock_log(self, path: Path, append: bool = False) -> None:
+        """
+        Writes the recorded time_correction() samples to a CSV file.
+
+        Args:
+            path: Output file.
+            append: Append to an existing log (resumed sweep).
+        """
+        new_file: bool = not (append and path.exists())
+        with open(path, "w" if new_file else "a", newline="") as f:
+            log = csv.writer(f)
+            if new_file:
+                log.writerow(CLOCK_LOG_HEADER)
+            log.writerows(self.clock_offsets)
+
+    def clock_summary(self) -> List[str]:
+        """Returns clock offset statistics as report lines."""
+        lines: List[str] = [
+            f"Timestamps: {'local clock (clocksync)' if self.clock_synced else 'sender clock'}"
+        ]
+        if not self.clock_offsets:
+            return lines + ["No time_correction() samples recorded"]
+        times, offsets = np.asarray(self.clock_offsets).T
+        ms: np.ndarray = offsets * 1000
+        lines.append(
+            f"time_correction(): n={len(ms)}, mean={ms.mean():.3f} ms, "
+            f"min={ms.min():.3f} ms, max={ms.max():.3f} ms"
+        )
+        if len(times) > 1 and times[-1] > times[0]:
+            drift: float = np.polyfit(times, offsets, 1)[0]
+            lines.append(f"Drift: {drift * 1e6:.2f} ppm over {times[-1] - times[0]:.0f} s")
+        return lines
+
+    def to_stream_time(self, local_time: float) -> float:
+        """
+        Converts a local_clock() time (e.g. a serial command's send time) to
+        the stream's clock, on which sample timestamps are expressed.
+
+        Args:
+            local_time: A local_clock() time.
+
+        Returns:
+            The same instant on the stream's clock (local time minus offset).
+        """
+        if self.clock_synced:
+            return local_time
+        if self.thread is not None:
+            # The inlet belongs to the acquisition thread: use its latest estimate
+            return local_time - (self.clock_offsets[-1][1] if self.clock_offsets else 0.0)
+        try:
+            return local_time - self.inlet.time_correction(timeout=2.0)
+        except LSLTimeoutError:
+            return local_time
+
+    def stream_time(self) -> float:
+        """Returns the current time on the stream's clock (local_clock minus offset)."""
+        return self.to_stream_time(local_clock())
+
+
+def block_to_rows(
+    block: np.ndarray, marker: Optional[Union[int, float, str]] = None, label_column: bool = True
+) -> List[List[Any]]:
+    """
+    Converts a [timestamp + channels] block into CSV rows.
+
+    Args:
+        block: Array returned by ChunkPuller.pull_block.
+        marker: Optional marker code written on the first row.
+        label_column: Append the legacy Label column.
+
+    Returns:
+        The rows, as lists of Python values.
+    """
+    if not label_column:
+        return block.tolist()
+    rows: np.ndarray = np.empty((block.shape[0], block.shape[1] + 1), dtype=object)
+    rows[:, :-1] = block
+    rows[:, -1] = ""
+    if marker is not None and block.shape[0] > 0:
+        rows[0, -1] = str(marker)
+    return rows.tolist()
+
+
+def channel_names(count: int = EEG_CHANNELS_COUNT) -> List[str]:
+    """Returns the channel names used in recording headers (Ch1..ChN)."""
+    return [f"Ch{i+1}" for i in range(count)]
+
+
+def complete_csv_rows(path: Path, limit: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Finds the complete data rows of an existing CSV file.
+
+    A last row cut short by a crash (no trailing newline) is not counted.
+
+    Args:
+        path: Path of the CSV file.
+        limit: Stop counting after this many data rows.
+
+    Returns:
+        A tuple (data rows excluding the header, byte offset just past the last complete row).
+    """
+    if not path.exists():
+        return 0, 0
+    lines: int = 0
+    end: int = 0
+    position: int = 0
+    wanted: Optional[int] = None if limit is None else limit + 1  # Plus the header line
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            newlines: int = chunk.count(b"\n")
+            if wanted is not None and lines + newlines >= wanted:
+                index: int = -1
+                for _ in range(wanted - lines):
+                    index = chunk.index(b"\n", index + 1)
+                return limit, position + index + 1
+            if newlines:
+                lines += newlines
+                end = position + chunk.rindex(b"\n") + 1
+            position += len(chunk)
+    return max(0, lines - 1), end
+
+
+def truncate_table(path: Path, column: str, limit: int) -> None:
+    """
+    Drops the rows of a CSV sidecar table whose `column` is above `limit`.
+
+    Used when appending to a recording that was cut back to its complete
+    samples, so no event or segment points past its end. A last row cut
+    short by a crash is dropped as well.
+
+    Args:
+        path: Path of the table (left alone if missing).
+        column: Name of the sample index column.
+        limit: Largest sample index kept.
+    """
+    if not path.exists():
+        return
+    text: str = path.read_text()
+    torn: bool = bool(text) and not text.endswith("\n")
+    rows: List[List[str]] = list(csv.reader(text.splitlines()[:-1] if torn else text.splitlines()))
+    if not rows:
+        if torn:
+            os.truncate(path, 0)  # Only a partial header: written again on open
+        return
+    header, body = rows[0], rows[1:]
+    index: int = header.index(column)
+    kept: List[List[str]] = [row for row in body if int(row[index]) <= limit]
+    if len(kept) == len(body) and not torn:
+        return
+    logging.warning(
+        f"{path.name}: dropped {len(body) - len(kept) + torn} rows that are incomplete "
+        "or point past the end of the recording"
+    )
+    tmp_path: Path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", newline="") as f:
+        csv.writer(f).writerows([header] + kept)
+    os.replace(tmp_path, path)
+
+
+class CsvRecordingSink:
+    """Writes blocks as CSV rows: [Timestamp, Ch1..ChN] (+ legacy Label)."""
+
+    def __init__(
+        self,
+        path: Path,
+        append: bool = False,
+        label_column: bool = False,
+        keep_samples: Optional[int] = None,
+        channel_count: int = EEG_CHANNELS_COUNT,
+    ) -> None:
+        """
+        Opens the CSV file and writes the header if the file is new.
+
+        Args:
+            path: Path of the CSV file.
+            append: Append to an existing file instead of truncating it.
+            label_column: Also write markers to a Label column on every row.
+            keep_samples: When appending, first cut the file back to this many rows.
+            channel_count: Number of recorded channels named in the header.
+        """
+        self.path: Path = path
+        self.label_column: bool = label_column
+        self.sample_count: int = 0
+        if append and path.exists():
+            # Cut a row left incomplete by an interrupted run, so the first
+            # appended row starts on a line of its own
+            self.sample_count, end = complete_csv_rows(path, keep_samples)
+            if end < path.stat().st_size:
+                logging.warning(
+                    f"{path.name}: dropped {path.stat().st_size - end} bytes past row "
+                    f"{self.sample_count}"
+                )
+                os.truncate(path, end)
+        self.file = open(path, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            # Write header for research traceability
+            self.writer.writerow(
+                ["Timestamp"] + channel_names(channel_count) + (["Label"] if label_column else [])
+            )
+
+    @property
+    def byte_offset(self) -> int:
+        """Current end of the file, where the next row will start."""
+        return self.file.tell()
+
+    def write_block(self, block: np.ndarray, marker: Optional[Union[int, float, str]]) -> None:
+        """Writes a [timestamp + channels] block, labelling its first row if enabled."""
+        self.writer.writerows(block_to_rows(block, marker, self.label_column))
+        self.sample_count += block.shape[0]
+
+    def flush(self) -> None:
+        """Forces written rows to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Closes the CSV file."""
+        self.file.close()
+
+
+class BinaryRecordingSink:
+    """
+    Writes blocks as raw float32 channel data plus float64 timestamps.
+
+    Each recording consists of three files sharing the CSV naming stem:
+    ``<stem>.f32`` (samples x channels, C order), ``<stem>.ts.f64`` and a
+    ``<stem>.json`` header with channel names, nominal rate and markers.
+    Both data files can be opened directly with numpy.memmap.
+    """
+
+    def __init__(
+        self,
+        stem: Path,
+        puller: ChunkPuller,
+        append: bool = False,
+        keep_samples: Optional[int] = None,
+    ) -> None:
+        """
+        Opens the data files and loads the existing header when appending.
+
+        Args:
+            stem: Path of the recording without extension.
+            puller: Chunk puller providing stream name, rate and channel count.
+            append: Append to an existing recording instead of truncating it.
+            keep_samples: When appending, first cut the recording back to this many samples.
+        """
+        self.path: Path = stem.with_name(stem.name + BINARY_DATA_SUFFIX)
+        self.timestamps_path: Path = stem.with_name(stem.name + BINARY_TIMESTAMPS_SUFFIX)
+        self.header_path: Path = stem.with_name(stem.name + BINARY_HEADER_SUFFIX)
+        self.header: Dict[str, Any] = {
+            "version": BINARY_FORMAT_VERSION,
+            "stream_name": puller.stream_name,
+            "nominal_srate": puller.nominal_srate,
+            "channel_names": channel_names(puller.channel_count),
+            "data_dtype": "float32",
+            "timestamps_dtype": "float64",
+            "sample_count": 0,
+            "markers": [],
+        }
+        if append and self.header_path.exists():
+            self.header = json.loads(self.header_path.read_text())
+        if append:
+            self.align_files(keep_samples)
+        mode: str = "ab" if append else "wb"
+        self.data_file = open(self.path, mode)
+        self.timestamps_file = open(self.timestamps_path, mode)
+        self.write_header()
+
+    def align_files(self, keep_samples: Optional[int] = None) -> None:
+        """
+        Cuts both data files back to the samples complete in each of them.
+
+        An interrupted run can leave the data and timestamp files with
+        different row counts (or a partial row); appending to them would pair
+        every new sample with the wrong timestamp. The files are trusted over
+        the header, whose sample count and markers are updated to match.
+
+        Args:
+            keep_samples: Also cut the recording back to this many samples.
+        """
+        row_bytes: int = 4 * len(self.header["channel_names"])
+        data_size: int = self.path.stat().st_size if self.path.exists() else 0
+        timestamps_size: int = (
+            self.timestamps_path.stat().st_size if self.timestamps_path.exists() else 0
+        )
+        samples: int = min(data_size // row_bytes, timestamps_size // 8)
+        if keep_samples is not None:
+            samples = min(samples, keep_samples)
+        if (data_size, timestamps_size) != (samples * row_bytes, samples * 8):
+            logging.warning(
+                f"{self.path.name}: truncating to {samples} complete samples "
+                f"({data_size // row_bytes} data rows, {timestamps_size // 8} timestamps on disk)"
+            )
+            for path, row_size in ((self.path, row_bytes), (self.timestamps_path, 8)):
+                if path.exists():
+                    os.truncate(path, samples * row_size)
+        self.header["sample_count"] = samples
+        self.header["markers"] = [m for m in self.header["markers"] if m["sample"] < samples]
+
+    def write_block(self, block: np.ndarray, marker: Optional[Union[int, float, str]]) -> None:
+        """Appends a [timestamp + channels] block and records its marker."""
+        if marker is not None and block.shape[0] > 0:
+            self.header["markers"].append(
+                {
+                    "sample": self.header["sample_count"],
+                    "timestamp": float(block[0, 0]),
+                    "code": marker,
+                }
+            )
+        self.data_file.write(np.ascontiguousarray(block[:, 1:], dtype=np.float32).tobytes())
+        self.timestamps_file.write(np.ascontiguousarray(block[:, 0]).tobytes())
+        self.header["sample_count"] += block.shape[0]
+
+    @property
+    def sample_count(self) -> int:
+        """Number of samples in the recording so far."""
+        return self.header["sample_count"]
+
+    @property
+    def byte_offset(self) -> int:
+        """Offset of the next sample in the data file."""
+        return self.sample_count * 4 * len(self.header["channel_names"])
+
+    def write_header(self) -> None:
+        """Atomically rewrites the JSON header."""
+        tmp_path: Path = self.header_path.with_name(self.header_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.header, indent=2))
+        os.replace(tmp_path, self.header_path)
+
+    def flush(self) -> None:
+        """Forces written samples and the header to disk."""
+        for f in (self.data_file, self.timestamps_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self.write_header()
+
+    def close(self) -> None:
+        """Closes the data files and writes the final header."""
+        self.data_file.close()
+        self.timestamps_file.close()
+        self.write_header()
+
+
+def _blank_none(value: Any) -> Any:
+    """Writes None as an empty CSV cell."""
+    return "" if value is None else value
+
+
+class EventTable:
+    """
+    Sparse sidecar table of markers, one row per event.
+
+    Replaces the mostly empty Label column: analysis code can jump straight
+    to events by sample index or LSL timestamp without scanning recordings.
+    """
+
+    def __init__(self, path: Path, append: bool = False) -> None:
+        """
+        Opens the event table and writes the header if the file is new.
+
+        Args:
+            path: Path of the event table.
+            append: Append to an existing table instead of truncating it.
+        """
+        self.path: Path = path
+        self.file = open(path, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(EVENTS_HEADER)
+
+    def add(
+        self, sample: int, timestamp: float, code: Union[int, float, str], context: Dict[str, Any]
+    ) -> None:
+        """
+        Records one event and flushes it to disk.
+
+        Args:
+            sample: Index of the marked sample within the recording.
+            timestamp: LSL timestamp of the marked sample.
+            code: Marker code.
+            context: Recording context (channel, frequency, volume; None for baselines).
+        """
+        self.writer.writerow(
+            [sample, timestamp, code]
+            + [_blank_none(context.get(key)) for key in ("channel", "frequency", "volume")]
+        )
+        self.file.flush()
+
+    def close(self) -> None:
+        """Closes the event table."""
+        self.file.close()
+
+
+class SegmentIndex:
+    """
+    Index of phase segments within a continuous session recording.
+
+    Each row gives the sample range [StartSample, EndSample) of one phase of
+    one combination, plus the byte offset of its first sample in the data
+    file, so a reader can open any segment without scanning the recording.
+    """
+
+    def __init__(self, path: Path, append: bool = False) -> None:
+        """
+        Opens the index and writes the header if the file is new.
+
+        Args:
+            path: Path of the index.
+            append: Append to an existing index instead of truncating it.
+        """
+        self.path: Path = path
+        self.file = open(path, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(SEGMENTS_HEADER)
+        self.open_segment: Optional[List[Any]] = None
+
+    def start(
+        self, sample: int, byte_offset: int, code: Union[int, float, str], context: Dict[str, Any]
+    ) -> None:
+        """
+        Opens a segment at the given sample.
+
+        Args:
+            sample: Index of the first sample of the segment.
+            byte_offset: Offset of that sample in the data file.
+            code: Marker code of the phase.
+            context: Recording context (section, channel, frequency, volume, cycle).
+        """
+        self.open_segment = [
+            context.get("section", ""),
+            PHASE_NAMES.get(code, str(code)),
+            code,
+            _blank_none(context.get("channel")),
+            _blank_none(context.get("frequency")),
+            _blank_none(context.get("volume")),
+            _blank_none(context.get("cycle")),
+            sample,
+            byte_offset,
+        ]
+
+    def end(self, sample: int, first_timestamp: float, last_timestamp: float) -> None:
+        """
+        Closes the open segment and flushes its row to disk.
+
+        Args:
+            sample: Index one past the last sample of the segment.
+            first_timestamp: LSL timestamp of the first sample (nan if empty).
+            last_timestamp: LSL timestamp of the last sample (nan if empty).
+        """
+        if self.open_segment is None:
+            return
+        *fields, start_sample, byte_offset = self.open_segment
+        self.writer.writerow(
+            fields + [start_sample, sample, first_timestamp, last_timestamp, byte_offset]
+        )
+        self.file.flush()
+        self.open_segment = None
+
+    def close(self) -> None:
+        """Closes the index."""
+        self.file.close()
+
+
+def recording_path(config: "Config", stem: Path) -> Path:
+    """Returns the main data file of a recording in the configured format."""
+    suffix: str = BINARY_DATA_SUFFIX if config.format == "binary" else ".csv"
+    return stem.with_name(stem.name + suffix)
+
+
+def open_recording(
+    config: "Config",
+    puller: ChunkPuller,
+    stem: Path,
+    append: bool = False,
+    segmented: bool = False,
+    keep_samples: Optional[int] = None,
+    **context: Any,
+) -> "AsyncRecordingWriter":
+    """
+    Opens a recording in the configured format behind an AsyncRecordingWriter.
+
+    Args:
+        config: Configuration object (selects the output format).
+        puller: Chunk puller the recording is fed from.
+        stem: Path of the recording without extension.
+        append: Append to an existing recording instead of truncating it.
+        segmented: Also write a segment index (session layout).
+        keep_samples: When appending, first cut the recording back to this many
+            samples (the end of its last journaled unit).
+        **context: Initial recording context (section, channel, frequency, volume).
+
+    Returns:
+        The started AsyncRecordingWriter.
+    """
+    sink: Union[CsvRecordingSink, BinaryRecordingSink]
+    if config.format == "binary":
+        sink = BinaryRecordingSink(stem, puller, append, keep_samples)
+    else:
+        sink = CsvRecordingSink(
+            recording_path(config, stem),
+            append,
+            config.label_column,
+            keep_samples,
+            puller.channel_count,
+        )
+    events_path: Path = stem.with_name(stem.name + EVENTS_SUFFIX)
+    segments_path: Path = stem.with_name(stem.name + SEGMENTS_SUFFIX)
+    if append:
+        # Forget events and segments beyond the samples the sink kept
+        truncate_table(events_path, "Sample", sink.sample_count - 1)
+        if segmented:
+            truncate_table(segments_path, "EndSample", sink.sample_count)
+    events: EventTable = EventTable(events_path, append)
+    segments: Optional[SegmentIndex] = SegmentIndex(segments_path, append) if segmented else None
+    return AsyncRecordingWriter(sink, events, segments, context)
+
+
+def open_step_recording(
+    config: "Config",
+    puller: ChunkPuller,
+    session: Optional["AsyncRecordingWriter"],
+    stem: Path,
+    append: bool = False,
+    keep_samples: Optional[int] = None,
+    **context: Any,
+) -> Any:
+    """
+    Returns a context manager yielding the writer for one protocol step.
+
+    In the combination layout each step opens its own recording at `stem`.
+    In the session layout the shared session writer is reused (and left
+    open) after switching its context.
+
+    Args:
+        config: Configuration object.
+        puller: Chunk puller the recording is fed from.
+        session: The open session writer, or None in the combination layout.
+        stem: Path of the per-step recording without extension.
+        append: Append to an existing per-step recording.
+        keep_samples: When appending, first cut the per-step recording back to
+            this many samples.
+        **context: Recording context (section, channel, frequency, volume).
+    """
+    if session is not None:
+        session.set_context(**{"channel": None, "frequency": None, "volume": None, **context})
+        return contextlib.nullcontext(session)
+    return open_recording(
+        config, puller, stem, append, keep_samples=keep_samples, **context
+    )
+
+
+class AsyncRecordingWriter:
+    """
+    Persists recorded blocks on a dedicated writer thread.
+
+    The acquisition loop hands pulled chunks to a bounded queue and returns
+    to the inlet immediately, so a stalled disk (antivirus, USB drive,
+    network share) no longer stops the LSL buffer from being drained.
+    Formatting (CSV rows or binary) also happens on the writer thread.
+    """
+
+    def __init__(
+        self,
+        sink: Any,
+        events: Optional[EventTable] = None,
+        segments: Optional[SegmentIndex] = None,
+        context: Optional[Dict[str, Any]] = None,
+        max_queue: int = WRITER_QUEUE_MAXSIZE,
+    ) -> None:
+        """
+        Starts the writer thread.
+
+        Args:
+            sink: A CsvRecordingSink or BinaryRecordingSink.
+            events: Optional event table receiving every marker.
+            segments: Optional segment index (session layout).
+            context: Initial recording context stored with events and segments.
+            max_queue: Maximum number of chunks waiting to be written.
+        """
+        self.sink: Any = sink
+        self.events: Optional[EventTable] = events
+        self.segments: Optional[SegmentIndex] = segments
+        # Only touched by the writer thread; updated through queued messages so
+        # that it always applies to the right samples.
+        self.context: Dict[str, Any] = dict(context or {})
+        # Producer-side copy, as of the last set_context call
+        self.latest_context: Dict[str, Any] = dict(context or {})
+        self.segment_timestamps: List[float] = []
+        self.path: Path = sink.path
+        self.max_queue: int = max_queue
+        self.queue: "queue.Queue[Optional[Tuple[str, Any, float]]]" = queue.Queue(
+            maxsize=max_queue
+        )
+        self.peak_depth: int = 0
+        self.max_lag: float = 0.0
+        self.rows_written: int = 0
+        self.error: Optional[BaseException] = None
+        self.thread: threading.Thread = threading.Thread(
+            target=self._run, name="RecordingWriter", daemon=True
+        )
+        self.thread.start()
+
+    def __enter__(self) -> "AsyncRecordingWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        """Writer thread body: handles queued messages until the sentinel arrives."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            kind, payload, enqueued_at = item
+            if self.error is not None:
+                continue  # Keep draining so producers never block on a dead writer
+            try:
+                if kind == "block":
+                    self._write(*payload)
+                elif kind == "context":
+                    self.context.update(payload)
+                elif kind == "start" and self.segments is not None:
+                    self.segment_timestamps = []
+                    self.segments.start(
+                        self.sink.sample_count, self.sink.byte_offset, payload, self.context
+                    )
+                elif kind == "call":
+                    self.sink.flush()
+                    payload()
+                elif kind == "end" and self.segments is not None:
+                    first, last = (
+                        self.segment_timestamps if self.segment_timestamps else (np.nan, np.nan)
+                    )
+                    self.segments.end(self.sink.sample_count, first, last)
+            except Exception as e:
+                self.error = e
+                continue
+            self.max_lag = max(self.max_lag, time.perf_counter() - enqueued_at)
+
+    def _write(self, block: np.ndarray, marker: Optional[Union[int, float, str]]) -> None:
+        """Writes one block to the sink and its marker to the event table."""
+        first_sample: int = self.sink.sample_count
+        self.sink.write_block(block, marker)
+        self.rows_written += block.shape[0]
+        if block.shape[0] == 0:
+            return
+        if marker is not None and self.events is not None:
+            self.events.add(first_sample, float(block[0, 0]), marker, self.context)
+        if self.segments is not None and self.segments.open_segment is not None:
+            first: float = (
+                self.segment_timestamps[0] if self.segment_timestamps else float(block[0, 0])
+            )
+            self.segment_timestamps = [first, float(block[-1, 0])]
+
+    def _put(self, kind: str, payload: Any) -> None:
+        """Queues a message for the writer thread. Blocks only when the queue is full."""
+        if self.error is not None:
+            raise IOError(f"Recording writer failed: {self.error}")
+        self.queue.put((kind, payload, time.perf_counter()))
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+    @property
+    def segmented(self) -> bool:
+        """True if this recording keeps a segment index (session layout)."""
+        return self.segments is not None
+
+    def write_block(
+        self, block: np.ndarray, marker: Optional[Union[int, float, str]] = None
+    ) -> None:
+        """
+        Queues a block for writing.
+
+        Args:
+            block: A [timestamp + channels] array owned by the caller no more.
+            marker: Optional marker code for the first row of the block.
+        """
+        self._put("block", (block, marker))
+
+    def set_context(self, **context: Any) -> None:
+        """
+        Updates the context (section, channel, frequency, volume, cycle) stored
+        with subsequent events and segments.
+        """
+        self.latest_context.update(context)
+        self._put("context", context)
+
+    def call_after_flush(self, callback: Callable[[], None]) -> None:
+        """
+        Runs `callback` on the writer thread once everything queued so far has
+        been written and flushed to disk.
+        """
+        self._put("call", callback)
+
+    def start_segment(self, code: Union[int, float, str]) -> None:
+        """Opens a segment at the next written sample (session layout only)."""
+        if self.segmented:
+            self._put("start", code)
+
+    def end_segment(self) -> None:
+        """Closes the open segment after the last written sample (session layout only)."""
+        if self.segmented:
+            self._put("end", None)
+
+    def close(self) -> None:
+        """Flushes all queued blocks, stops the writer thread and closes the sink."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+            self.sink.close()
+            if self.events is not None:
+                self.events.close()
+            if self.segments is not None:
+                self.segments.close()
+        if self.error is not None:
+            raise IOError(f"Recording writer failed: {self.error}")
+
+    def report(self) -> None:
+        """Logs queue depth and writer lag statistics."""
+        logging.info(
+            f"Writer: {self.rows_written} rows, peak queue depth "
+            f"{self.peak_depth}/{self.max_queue}, max lag {self.max_lag * 1000:.1f} ms"
+        )
+
+
+class SweepJournal:
+    """
+    Append-only journal of completed (channel, frequency, volume, cycle) units.
+
+    One JSON line per unit, flushed and fsynced as soon as the unit's samples
+    are on disk, so `--resume` can skip exactly what was recorded. Each line
+    also holds the sample count of the recording at the end of the unit, so
+    `--resume` can cut off the half-recorded unit a crash interrupted before
+    appending to that recording again.
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        """
+        Opens the journal, loading the units already in it when resuming.
+
+        Args:
+            path: Path of the journal file.
+            resume: Keep and load an existing journal instead of starting a new one.
+        """
+        self.path: Path = path
+        self.completed: Set[Tuple[int, int, int, int]] = set()
+        # Samples of each recording (by file name) at the end of its last journaled unit
+        self.recorded: Dict[str, int] = {}
+        # Journals written before sample counts were journaled cannot locate units
+        self.positions_known: bool = False
+        if resume and path.exists():
+            entries: List[Dict[str, Any]] = []
+            for line in path.read_text().splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # A torn last line from a crash
+            for entry in entries:
+                if "cycle" in entry:
+                    self.completed.add(
+                        (entry["channel"], entry["frequency"], entry["volume"], entry["cycle"])
+                    )
+                if "recording" in entry:
+                    self.recorded[entry["recording"]] = entry["samples"]
+            self.positions_known = bool(entries) and all("samples" in e for e in entries)
+        self.file = open(path, "a" if resume else "w")
+
+    def recorded_samples(self, path: Path) -> Optional[int]:
+        """
+        Returns the samples of a recording that belong to journaled units.
+
+        Args:
+            path: Main data file of the recording.
+
+        Returns:
+            The sample count to cut the recording back to before appending
+            (0 if none of its units completed), or None if the journal
+            cannot tell.
+        """
+        if not self.positions_known:
+            return None
+        return self.recorded.get(path.name, 0)
+
+    def pending_cycles(self, channel: int, frequency: int, volume: int, cycles: int) -> List[int]:
+        """Returns the cycles (1-based) of a combination not yet completed."""
+        return [
+            cycle
+            for cycle in range(1, cycles + 1)
+            if (channel, frequency, volume, cycle) not in self.completed
+        ]
+
+    def record(
+        self, channel: int, frequency: int, volume: int, cycle: int, recording: Path, samples: int
+    ) -> None:
+        """
+        Appends a completed unit and forces it to disk.
+
+        Args:
+            channel: VHP channel of the unit.
+            frequency: VHP frequency of the unit.
+            volume: VHP volume of the unit.
+            cycle: Stimulation cycle (1-based).
+            recording: Main data file the unit was recorded to.
+            samples: Sample count of that recording at the end of the unit.
+        """
+        self._write(
+            {
+                "channel": channel,
+                "frequency": frequency,
+                "volume": volume,
+                "cycle": cycle,
+                "recording": recording.name,
+                "samples": samples,
+            }
+        )
+        self.completed.add((channel, frequency, volume, cycle))
+
+    def record_baselines(self, recording: Path, samples: int) -> None:
+        """
+        Appends the end of the baselines, which `--resume` does not record again.
+
+        Args:
+            recording: Main data file baseline 2 was recorded to.
+            samples: Sample count of that recording at the end of baseline 2.
+        """
+        self._write({"section": "baselines", "recording": recording.name, "samples": samples})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        """Appends one timestamped entry and forces it to disk."""
+        entry["completed"] = datetime.now().isoformat(timespec="seconds")
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.recorded[entry["recording"]] = entry["samples"]
+
+    def close(self) -> None:
+        """Closes the journal."""
+        self.file.close()
+
+
+def claim_phase_start(
+    puller: ChunkPuller, writer: AsyncRecordingWriter, block: np.ndarray, start_time: float
+) -> np.ndarray:
+    """
+    Splits off the samples of a block acquired before a phase starts.
+
+    Samples from the last PHASE_TRANSITION_MAX_SEC before start_time (the
+    serial commands between two phases) stay in the file or session, ahead of
+    the phase's marker and segment. Older ones, acquired while the operator
+    was prompted or the VHP was being powered on, are discarded.
+
+    Args:
+        puller: The chunk puller wrapping the LSL stream inlet.
+        writer: An open AsyncRecordingWriter.
+        block: Samples pulled before the phase's first sample was seen.
+        start_time: Start of the phase on the stream clock.
+
+    Returns:
+        The samples from start_time on.
+    """
+    first_kept, first_claimed = np.searchsorted(
+        block[:, 0], [start_time - PHASE_TRANSITION_MAX_SEC, start_time]
+    )
+    puller.discarded += int(first_kept)
+    if first_claimed > first_kept:
+        writer.write_block(block[first_kept:first_claimed])
+    return block[first_claimed:]
+
+
+def log_discarded(samples: int) -> None:
+    """Logs samples discarded by claim_phase_start for one phase, if any."""
+    if samples:
+        logging.info(
+            f"Discarded {samples} samples acquired more than "
+            f"{PHASE_TRANSITION_MAX_SEC:g} s before the phase"
+        )
+
+
 def record_to_csv(
-    inlet: StreamInlet,
+    puller: ChunkPuller,
     duration: float,
-    writer: Any,
+    writer: AsyncRecordingWriter,
     marker: Optional[Union[int, float, str]] = None,
+    deadline: Optional[float] = None,
+    start_time: Optional[float] = None,
 ) -> bool:
     """
     Records samples from an LSL inlet to a CSV writer for a given duration.
-    Optimized to use pull_chunk for bulk retrieval and writerows for fast I/O.
+    Optimized to pull chunks into a preallocated NumPy buffer and to keep
+    disk I/O on the AsyncRecordingWriter thread.
+
+    The phase claims the samples whose timestamps fall between its start and
+    end on the stream clock, so samples acquired while serial commands were
+    sent are attributed to the right phase (see claim_phase_start), and
+    samples past the end are left for the next one.
 
     Args:
-        inlet: The LSL stream inlet.
+        puller: The chunk puller wrapping the LSL stream inlet.
         duration: Duration of recording in seconds.
-        writer: An open CSV writer object.
+        writer: An open AsyncRecordingWriter.
         marker: Optional marker code to associate with the first sample.
+        deadline: Absolute time.monotonic() at which to stop; overrides duration.
+        start_time: Start of the phase on the stream clock, e.g. the send time
+            of the serial command that started it (default: now).
 
     Returns:
         True if the marker was written, False otherwise.
     """
-    start: float = time.time()
+    now: float = puller.stream_time()
+    start_time = now if start_time is None else start_time
+    end_time: float = (
+        now + (deadline - time.monotonic()) if deadline is not None else start_time + duration
+    )
+    end: float = time.monotonic() + (end_time - now)
+    discarded: int = puller.discarded
+    started: bool = False
     marker_written: bool = False
 
-    while (time.time() - start) < duration:
-        # pull_chunk(timeout=0.0) drains everything currently in the buffer.
-        # This is more efficient than pull_sample() one by one.
-        samples, timestamps = inlet.pull_chunk(timeout=0.0)
+    def write(block: np.ndarray) -> None:
+        nonlocal marker_written
+        writer.write_block(block, None if marker_written else marker)
+        puller.loss.count(block.shape[0])
+        marker_written = marker_written or marker is not None
+
+    while True:
+        # Drains everything currently buffered, or waits (at most the target
+        # latency) for the next samples
+        block: np.ndarray = puller.wait_block(end + PHASE_END_GRACE_SEC - time.monotonic())
+        stalled: bool = time.monotonic() >= end + PHASE_END_GRACE_SEC
+        if not started:
+            block = claim_phase_start(puller, writer, block, start_time)
+            if not block.shape[0] and not stalled:
+                continue
+            started = True
+            writer.start_segment(marker if marker is not None else "")
+            puller.loss.begin_phase(
+                marker, round((end_time - start_time) * puller.nominal_srate), writer.latest_context
+            )
+            log_discarded(puller.discarded - discarded)
+
+        inside: int = int(np.searchsorted(block[:, 0], end_time))
+        if inside:
+            write(block[:inside])
+        if inside < block.shape[0]:
+            # The first sample past the end closes the phase; the rest is the next one's
+            puller.unread(block[inside:])
+            break
+        if stalled:
+            break  # Nothing past the end arrived in time
+    writer.end_segment()
+    puller.loss.end_phase()
 
-        if timestamps:
-            rows: List[List[Any]] = []
-            for sample, ts in zip(samples, timestamps):
-                label: str = ""
-                if marker is not None and not marker_written:
-                    label = str(marker)
-                    marker_written = True
-
-                rows.append([ts] + sample[:EEG_CHANNELS_COUNT] + [label])
+    return marker_written
 
-            writer.writerows(rows)
-        else:
-            # Yield to the OS to minimize CPU load while waiting for data.
-            # 5ms is a safe interval that won't overflow the LSL internal buffer.
-            time.sleep(0.005)
-
-    # Perform a final drain to capture samples that arrived at the last moment.
-    samples, timestamps = inlet.pull_chunk(timeout=0.0)
-    if timestamps:
-        rows = []
-        for sample, ts in zip(samples, timestamps):
-            label = ""
-            if marker is not None and not marker_written:
-                label = str(marker)
-                marker_written = True
-            rows.append([ts] + sample[:EEG_CHANNELS_COUNT] + [label])
-        writer.writerows(rows)
 
-    return marker_written
+def record_samples_to_csv(
+    puller: ChunkPuller,
+    sample_count: int,
+    writer: AsyncRecordingWriter,
+    marker: Optional[Union[int, float, str]] = None,
+    start_time: Optional[float] = None,
+) -> None:
+    """
+    Records exactly `sample_count` samples, independent of wall-clock timing.
 
+    Phases recorded back to back are contiguous in the stream: samples pulled
+    beyond the count are handed back to the puller for the next phase.
 
-def record_buffer_to_csv(inlet: StreamInlet, fname: Union[str, Path]) -> None:
+    Args:
+        puller: The chunk puller wrapping the LSL stream inlet.
+        sample_count: Number of samples in the phase.
+        writer: An open AsyncRecordingWriter.
+        marker: Optional marker code to associate with the first sample.
+        start_time: If given (stream clock), the phase starts at the first
+            sample at or after it (see claim_phase_start).
+    """
+    received: int = 0
+    last_data: float = time.monotonic()
+    discarded: int = puller.discarded
+    started: bool = start_time is None
+    if started:
+        writer.start_segment(marker if marker is not None else "")
+        puller.loss.begin_phase(marker, sample_count, writer.latest_context)
+
+    while received < sample_count:
+        block: np.ndarray = puller.wait_block(puller.target_latency)
+        if not block.shape[0]:
+            if time.monotonic() - last_data > STREAM_STALL_TIMEOUT_SEC:
+                raise RuntimeError(
+                    f"No samples for {STREAM_STALL_TIMEOUT_SEC}s "
+                    f"({received}/{sample_count} recorded)"
+                )
+            continue
+        last_data = time.monotonic()
+
+        if not started:
+            block = claim_phase_start(puller, writer, block, start_time)
+            if not block.shape[0]:
+                continue
+            started = True
+            writer.start_segment(marker if marker is not None else "")
+            puller.loss.begin_phase(marker, sample_count, writer.latest_context)
+            log_discarded(puller.discarded - discarded)
+
+        take: int = min(block.shape[0], sample_count - received)
+        writer.write_block(block[:take], marker if received == 0 else None)
+        puller.unread(block[take:])
+        received += take
+
+    writer.end_segment()
+    puller.loss.count(received)
+    puller.loss.end_phase()
+
+
+def record_buffer_to_csv(puller: ChunkPuller, fname: Union[str, Path]) -> None:
     """
     Legacy helper to record currently available samples to a file.
     Note: record_to_csv is now preferred for its batch processing.
     """
-    samples, timestamps = inlet.pull_chunk()
+    block: np.ndarray = puller.pull_block()
 
-    if not timestamps:
+    if not block.shape[0]:
         return
 
-    rows = [[ts] + sample[:EEG_CHANNELS_COUNT] + [""] for ts, sample in zip(timestamps, samples)]
-
     with open(fname, "a", newline="") as f:
         writer = csv.writer(f)
-        writer.writerows(rows)
+        writer.writerows(block_to_rows(block))
 
     # """Record samples from LSL inlet to CSV for given duration.
     # Layout: [timestamp] + 33 EEG channels + [marker column]."""
@@ -304,6 +2338,174 @@ def record_buffer_to_csv(inlet: StreamInlet, fname: Union[str, Path]) -> None:
     #     return
 
 
+# --------------------------------------------------------------------
+# Scheduling
+# --------------------------------------------------------------------
+
+
+class SweepScheduler:
+    """
+    Plans absolute monotonic deadlines for every phase of the sweep up front.
+
+    Phase k ends at sweep start + the sum of the planned durations of phases
+    0..k, so serial command overhead is absorbed by the following phase
+    instead of accumulating into drift. In the other timing modes the plan is
+    only used to measure how far the timeline drifts.
+    """
+
+    def __init__(
+        self, config: Config, pending: Dict[Tuple[int, int, int], List[int]]
+    ) -> None:
+        """
+        Builds the phase plan for the combinations and cycles to record.
+
+        Args:
+            config: Configuration object (durations and timing mode).
+            pending: Cycles to record for each (channel, frequency, volume).
+        """
+        self.mode: str = config.timing
+        self.enforce: bool = config.timing == "deadline"
+        self.plan: List[Tuple[int, float]] = []  # (marker code, offset of phase end)
+        offset: float = 0.0
+        for cycles in pending.values():
+            if not cycles:
+                continue
+            phases: List[Tuple[int, float]] = [(333, float(config.baseline_3))]
+            for _ in cycles:
+                phases += [
+                    (0, config.measurements_duration_on),
+                    (1, config.measurements_duration_on),
+                    (11, config.measurements_duration_off),
+                ]
+            for code, duration in phases:
+                offset += duration
+                self.plan.append((code, offset))
+
+        self.start_time: float = 0.0
+        self.next_phase: int = 0
+        self.current_deadline: float = 0.0
+        self.overshoots: Dict[int, List[float]] = {}
+        self.transitions: List[Tuple[float, float]] = []  # Pipelined (hidden, exposed) seconds
+
+    def start(self) -> None:
+        """Anchors the plan at the current time."""
+        self.start_time = time.monotonic()
+        self.next_phase = 0
+
+    def begin_phase(self, code: int) -> Optional[float]:
+        """
+        Moves to the next planned phase.
+
+        Args:
+            code: Marker code of the phase being started (checked against the plan).
+
+        Returns:
+            The phase's absolute deadline, or None when deadlines are not enforced.
+        """
+        planned_code, offset = self.plan[self.next_phase]
+        if planned_code != code:
+            raise RuntimeError(f"Sweep schedule out of step: expected {planned_code}, got {code}")
+        self.next_phase += 1
+        self.current_deadline = self.start_time + offset
+        return self.current_deadline if self.enforce else None
+
+    def end_phase(self, code: int) -> None:
+        """Records how late the phase ended relative to its planned deadline."""
+        self.overshoots.setdefault(code, []).append(time.monotonic() - self.current_deadline)
+
+    def record_transition(self, hidden: float, exposed: float) -> None:
+        """
+        Records a pipelined parameter change.
+
+        Args:
+            hidden: Serial time spent while the OFF phase was still recording.
+            exposed: Time the sweep had to wait for it after the OFF phase.
+        """
+        self.transitions.append((hidden, exposed))
+
+    def summary(self) -> List[str]:
+        """Returns per-phase overshoot and transition statistics as report lines."""
+        lines: List[str] = [f"Timing mode: {self.mode}"]
+        for code, values in self.overshoots.items():
+            ms: np.ndarray = np.asarray(values) * 1000
+            lines.append(
+                f"{PHASE_NAMES.get(code, code)} ({code}): n={len(ms)} "
+                f"overshoot mean={ms.mean():.1f} ms, p95={np.percentile(ms, 95):.1f} ms, "
+                f"max={ms.max():.1f} ms"
+            )
+        if self.next_phase:
+            planned: float = self.plan[self.next_phase - 1][1]
+            actual: float = planned + self.overshoots[self.plan[self.next_phase - 1][0]][-1]
+            lines.append(f"Recorded phases took {actual:.2f} s (planned {planned:.2f} s)")
+        if self.transitions:
+            hidden, exposed = np.asarray(self.transitions).sum(axis=0)
+            lines.append(
+                f"Pipelined transitions: {len(self.transitions)}, "
+                f"hidden {hidden * 1000:.0f} ms, exposed {exposed * 1000:.0f} ms"
+            )
+        return lines
+
+    def report(self) -> None:
+        """Logs the overshoot statistics."""
+        for line in self.summary():
+            logging.info(f"Schedule: {line}")
+
+
+class ParameterPrestager:
+    """
+    Sends the next combination's parameters during the current OFF phase.
+
+    Stimulation is stopped during OFF, so the channel/volume/frequency change
+    can go out from a timer thread while the main thread keeps recording.
+    The serial port is otherwise idle until the OFF phase ends and finish()
+    is called.
+    """
+
+    def __init__(
+        self, com: SerialCommunicator, combination: Tuple[int, int, int], delay: float
+    ) -> None:
+        """
+        Schedules the parameter change.
+
+        Args:
+            com: Serial communicator for VHP.
+            combination: Next (channel, frequency, volume).
+            delay: Seconds from now at which the commands are sent.
+        """
+        self.com: SerialCommunicator = com
+        self.combination: Tuple[int, int, int] = combination
+        self.elapsed: float = 0.0
+        self.error: Optional[BaseException] = None
+        self.timer: threading.Timer = threading.Timer(delay, self._run)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _run(self) -> None:
+        """Timer body: sends the parameters and measures how long it took."""
+        channel, frequency, volume = self.combination
+        start: float = time.perf_counter()
+        try:
+            self.com.set_parameters(channel=channel, volume=volume, frequency=frequency)
+        except BaseException as e:  # Re-raised on the main thread by finish()
+            self.error = e
+        self.elapsed = time.perf_counter() - start
+
+    def finish(self) -> Tuple[float, float]:
+        """
+        Waits for the parameter change to complete.
+
+        Returns:
+            A tuple (hidden, exposed): seconds of serial time overlapped with
+            recording, and seconds the caller had to wait for it.
+        """
+        start: float = time.perf_counter()
+        self.timer.join()
+        exposed: float = time.perf_counter() - start
+        if self.error is not None:
+            raise self.error
+        return max(0.0, self.elapsed - exposed), exposed
+
+
 # --------------------------------------------------------------------
 # Measurement Loop
 # --------------------------------------------------------------------
@@ -311,7 +2513,7 @@ def record_buffer_to_csv(inlet: StreamInlet, fname: Union[str, Path]) -> None:
 
 def do_measurement(
     com: SerialCommunicator,
-    inlet: StreamInlet,
+    puller: ChunkPuller,
     config: Config,
     channel: int,
     frequency: int,
@@ -319,13 +2521,18 @@ def do_measurement(
     global_counter: List[int],
     global_total: int,
     global_start_time: float,
+    session: Optional[AsyncRecordingWriter] = None,
+    journal: Optional[SweepJournal] = None,
+    cycles_to_run: Optional[List[int]] = None,
+    scheduler: Optional[SweepScheduler] = None,
+    next_combination: Optional[Tuple[int, int, int]] = None,
 ) -> None:
     """
     Executes a single parameter combination measurement cycle.
 
     Args:
         com: Serial communicator for VHP.
-        inlet: LSL stream inlet.
+        puller: Chunk puller wrapping the LSL stream inlet.
         config: Configuration object.
         channel: Target VHP channel.
         frequency: Target VHP frequency.
@@ -333,51 +2540,122 @@ def do_measurement(
         global_counter: Mutable global step counter.
         global_total: Total steps in the sweep.
         global_start_time: Start time of the entire sweep (time.perf_counter()).
+        session: Open session writer in the session layout, None otherwise.
+        journal: Journal receiving each completed cycle.
+        cycles_to_run: Cycles (1-based) to record; all cycles if None.
+        scheduler: Sweep scheduler providing phase deadlines.
+        next_combination: In a pipelined sweep, the (channel, frequency, volume)
+            to stage during the last OFF phase.
     """
     logging.info(f"Measuring: CH={channel}, FREQ={frequency}, VOL={volume}")
     
     recordings_dir: Path = Path("./Recordings")
     recordings_dir.mkdir(exist_ok=True)
     
-    fname: Path = (
+    stem: Path = (
         recordings_dir
-        / f"{config.timestamp}_{config.board_id}_c{channel}_f{frequency}_v{volume}.csv"
+        / f"{config.timestamp}_{config.board_id}_c{channel}_f{frequency}_v{volume}"
     )
 
-    with open(fname, "w", newline="") as f:
-        writer = csv.writer(f)
-        # Write header for research traceability
-        header: List[str] = ["Timestamp"] + [f"Ch{i+1}" for i in range(EEG_CHANNELS_COUNT)] + ["Label"]
-        writer.writerow(header)
-        
+    def record_phase(duration: float, code: int, sent_at: Optional[float] = None) -> None:
+        """
+        Records one phase according to the configured timing mode.
+
+        The phase starts at `sent_at`, the local_clock() send time of the
+        serial command that started it, or now if no command did.
+        """
+        deadline: Optional[float] = scheduler.begin_phase(code) if scheduler else None
+        if sent_at is None:
+            sent_at = local_clock()
+            if com.markers is not None:
+                # Phases not started by a serial command are marked when they begin
+                com.markers.push(code, sent_at)
+        start_time: float = puller.to_stream_time(sent_at)
+        if config.timing == "samples":
+            # Rest continues contiguously from the previous phase; the others
+            # start at their command (or, for baseline 3, now)
+            record_samples_to_csv(
+                puller,
+                round(duration * puller.nominal_srate),
+                writer,
+                marker=code,
+                start_time=start_time if code != 0 else None,
+            )
+        else:
+            record_to_csv(
+                puller, duration, writer, marker=code, deadline=deadline, start_time=start_time
+            )
+        if scheduler:
+            scheduler.end_phase(code)
+
+    keep_samples: Optional[int] = None
+    if config.resume and journal is not None and session is None:
+        # Drop what a crash left of this combination's interrupted cycle
+        keep_samples = journal.recorded_samples(recording_path(config, stem))
+    with open_step_recording(
+        config,
+        puller,
+        session,
+        stem,
+        append=config.resume,
+        keep_samples=keep_samples,
+        section="sweep",
+        channel=channel,
+        frequency=frequency,
+        volume=volume,
+    ) as writer:
         # ---------------------------------------------------------
         # Baseline 3 (Contact)
         # ---------------------------------------------------------
         logging.info("Baseline 3 (contact) recording...")
-        record_to_csv(inlet, float(config.baseline_3), writer, marker=333)
+        writer.set_context(cycle=None)
+        record_phase(float(config.baseline_3), 333)
 
         # Stim cycles
-        cycles: int = config.measurements_number
+        cycles: List[int] = cycles_to_run or list(range(1, config.measurements_number + 1))
         on_dur: float = config.measurements_duration_on
         off_dur: float = config.measurements_duration_off
 
-        logging.info(f"Stim cycles: {cycles} cycles (ON={on_dur}s, OFF={off_dur}s)")
+        logging.info(f"Stim cycles: {len(cycles)} cycles (ON={on_dur}s, OFF={off_dur}s)")
+
+        for cycle in cycles:
+            writer.set_context(cycle=cycle)
 
-        for cycle in range(1, cycles + 1):
             # ON
-            record_to_csv(inlet, on_dur, writer, marker=0)
-            com.start_stream()
-            
-            record_to_csv(inlet, on_dur, writer, marker=1)
-            com.stop_stream()
+            record_phase(on_dur, 0)
+            sent_at: float = com.start_stream()
+
+            record_phase(on_dur, 1, sent_at)
+            sent_at = com.stop_stream()
 
             # OFF
-            record_to_csv(inlet, off_dur, writer, marker=11)
+            prestager: Optional[ParameterPrestager] = None
+            if next_combination is not None and cycle == cycles[-1]:
+                prestager = ParameterPrestager(
+                    com, next_combination, max(0.0, off_dur - PIPELINE_LEAD_SEC)
+                )
+            record_phase(off_dur, 11, sent_at)
+            if prestager is not None:
+                hidden, exposed = prestager.finish()
+                logging.debug(
+                    f"Staged CH={next_combination[0]}, FREQ={next_combination[1]}, "
+                    f"VOL={next_combination[2]}: hidden {hidden * 1000:.1f} ms, "
+                    f"exposed {exposed * 1000:.1f} ms"
+                )
+                if scheduler:
+                    scheduler.record_transition(hidden, exposed)
+
+            if journal is not None:
+                unit: Tuple[int, int, int, int] = (channel, frequency, volume, cycle)
+                writer.call_after_flush(
+                    lambda unit=unit: journal.record(*unit, writer.path, writer.sink.sample_count)
+                )
 
             global_counter[0] += 1
             render_progress_bar("Global sweep", global_counter[0], global_total, global_start_time)
-        
-        print("") # Clear line after per-block cycles
+
+    print("") # Clear line after per-block cycles
+    writer.report()
 
 
 # --------------------------------------------------------------------
@@ -385,28 +2663,39 @@ def do_measurement(
 # --------------------------------------------------------------------
 
 
-def is_vhp_connected(port: str, baudrate: int = SERIAL_BAUDRATE, timeout: float = 1.0) -> bool:
+def is_vhp_connected(
+    port: str, vid: Optional[int] = None, pid: Optional[int] = None
+) -> bool:
     """
-    Checks if the VHP device is reachable via serial.
+    Checks if the VHP device is present by enumerating serial ports.
+
+    The port is never opened, so probing does not reset the device and
+    takes only a few milliseconds.
 
     Args:
         port: Serial port name.
-        baudrate: Serial baudrate.
-        timeout: Connection timeout in seconds.
+        vid: USB vendor ID of the VHP's serial adapter, None to match any.
+        pid: USB product ID of the VHP's serial adapter, None to match any.
 
     Returns:
         True if connected, False otherwise.
     """
-    try:
-        with serial.Serial(port, baudrate=baudrate, timeout=timeout) as ser:
-            time.sleep(1)
+    for info in serial.tools.list_ports.comports():
+        if info.device != port and os.path.realpath(info.device) != os.path.realpath(port):
+            continue
+        if (vid is None or info.vid == vid) and (pid is None or info.pid == pid):
             return True
-    except (serial.SerialException, OSError):
-        return False
+    # Ports that are not enumerated (e.g. pseudo-terminals) are present if
+    # their device node exists; USB IDs cannot be checked for them.
+    return vid is None and pid is None and os.path.exists(port)
 
 
 def write_metadata(
-    args: argparse.Namespace, config: Config, fname1: Path, fname2: Path
+    args: argparse.Namespace,
+    config: Config,
+    fname1: Path,
+    fname2: Path,
+    reports: Optional[Dict[str, List[str]]] = None,
 ) -> None:
     """
     Writes measurement metadata to a text file.
@@ -416,19 +2705,26 @@ def write_metadata(
         config: Configuration object.
         fname1: Path to the first baseline file.
         fname2: Path to the second baseline file.
+        reports: Optional report sections (title -> lines) appended at the end.
     """
     recordings_dir: Path = Path("./Recordings")
     fname: Path = recordings_dir / f"{config.timestamp}_metadata.txt"
     
     with open(fname, "w") as f:
         readable_timestamp: str = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        f.write(f"Recording on: {readable_timestamp}\n\n")
+        f.write(f"Recording on: {readable_timestamp}\n")
+        if config.resume:
+            f.write(f"Resumed sweep, completed units in: {config.timestamp}{JOURNAL_SUFFIX}\n")
+        f.write("\n")
         f.write("*** Measure Configuration ***\n")
         f.write(Path(args.measureconf).read_text())
         f.write("\n*** Device Configuration ***\n")
         f.write(Path(args.deviceconf).read_text())
         f.write(f"\nBaseline 1 (VHP OFF>ON): {fname1}\n")
         f.write(f"Baseline 2 (VHP ON, STIM ON, no contact): {fname2}\n")
+        for title, lines in (reports or {}).items():
+            f.write(f"\n*** {title} ***\n")
+            f.writelines(f"{line}\n" for line in lines)
 
 
 def render_progress_bar(
@@ -491,122 +2787,258 @@ def main() -> None:
     args, config = parse_cmdline()
     logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
 
-    inlet: StreamInlet = setup_lsl_inlet(config.stream_name)
-    # Drain any stale data from before script execution to ensure clean baseline
-    inlet.pull_chunk(timeout=0.0)
+    inlet: StreamInlet = setup_lsl_inlet(
+        config.stream_name,
+        config.inlet_max_buflen,
+        config.inlet_max_chunklen,
+        config.inlet_processing,
+    )
+    puller: ChunkPuller = ChunkPuller(
+        inlet,
+        loss_alert_percent=config.loss_alert,
+        clock_interval=config.clock_interval,
+        clock_synced="clocksync" in config.inlet_processing,
+        mode=config.pull_mode,
+        target_latency=config.pull_latency,
+        ring_seconds=config.ring_buffer,
+    )
+    if config.timing == "samples" and puller.nominal_srate <= 0:
+        logging.error("Sample-count timing needs a stream with a regular nominal rate")
+        return
+    # Acquire continuously from here on; data from before script execution is
+    # older than any phase and is discarded when the first phase claims its start
+    puller.start()
 
     recordings_dir: Path = Path("./Recordings")
     recordings_dir.mkdir(exist_ok=True)
     
-    fname1: Path = recordings_dir / f"{config.timestamp}_{config.board_id}_baseline_with_VHP_powered_OFF.csv"
-    fname2: Path = (
+    stem1: Path = recordings_dir / f"{config.timestamp}_{config.board_id}_baseline_with_VHP_powered_OFF"
+    stem2: Path = (
         recordings_dir
         / f"{config.timestamp}_{config.board_id}_baseline_with_VHP_powered_ON_stim_ON_no_contact_"
-        f"c{config.channel_start}_f{config.frequency_start}_v{config.volume_start}.csv"
+        f"c{config.channel_start}_f{config.frequency_start}_v{config.volume_start}"
     )
+    fname1: Path = recording_path(config, stem1)
+    fname2: Path = recording_path(config, stem2)
+
+    journal_path: Path = recordings_dir / f"{config.timestamp}{JOURNAL_SUFFIX}"
+    if config.resume and not journal_path.exists():
+        logging.error(f"Cannot resume: no journal at {journal_path}")
+        puller.stop()
+        return
+    journal: SweepJournal = SweepJournal(journal_path, config.resume)
+
+    markers: Optional[MarkerOutlet] = None
+    if config.marker_stream_name:
+        markers = MarkerOutlet(config.marker_stream_name, config.board_id)
+        logging.info(f"Publishing markers on LSL stream: {config.marker_stream_name}")
+    responses: Optional[ResponseOutlet] = None
+    if config.response_stream_name:
+        responses = ResponseOutlet(config.response_stream_name, config.board_id)
+        logging.info(f"Publishing VHP responses on LSL stream: {config.response_stream_name}")
+    vhpcom: Optional[SerialCommunicator] = None
+
+    session: Optional[AsyncRecordingWriter] = None
+    if config.layout == "session":
+        session_stem: Path = recordings_dir / f"{config.timestamp}_{config.board_id}_session"
+        session = open_recording(
+            config,
+            puller,
+            session_stem,
+            append=config.resume,
+            segmented=True,
+            # Drop what a crash left of the interrupted unit
+            keep_samples=(
+                journal.recorded_samples(recording_path(config, session_stem))
+                if config.resume
+                else None
+            ),
+        )
+        fname1 = fname2 = session.path
+        logging.info(f"Recording session to {session.path}")
 
     try:
         # ---------------------------- BASELINE 1 ----------------------------
-        if not is_vhp_connected(config.serial_port):
+        if not config.resume and not is_vhp_connected(
+            config.serial_port, config.vhp_vid, config.vhp_pid
+        ):
             logging.info("Recording Baseline 1 (waiting for VHP ON)...")
 
             # Record baseline with marker 3
-            with open(fname1, "a", newline="") as f:
-                writer = csv.writer(f)
-                if fname1.stat().st_size == 0:
-                    header: List[str] = ["Timestamp"] + [f"Ch{i+1}" for i in range(EEG_CHANNELS_COUNT)] + ["Label"]
-                    writer.writerow(header)
-                record_to_csv(inlet, 10.0, writer, marker=3)
+            with open_step_recording(
+                config, puller, session, stem1, append=True, section="baseline1"
+            ) as writer:
+                if markers is not None:
+                    markers.push(3)
+                record_to_csv(puller, 10.0, writer, marker=3)
             
-            while not is_vhp_connected(config.serial_port):
-                logging.info("Waiting for VHP to power ON...")
-                time.sleep(0.5)
+            logging.info("Waiting for VHP to power ON...")
+            while not is_vhp_connected(config.serial_port, config.vhp_vid, config.vhp_pid):
+                time.sleep(VHP_POLL_INTERVAL_SEC)
 
             logging.info("Baseline 1 started")
-            with open(fname1, "a", newline="") as f:
-                writer = csv.writer(f)
-                record_to_csv(inlet, float(config.baseline_1), writer, marker=33)
+            with open_step_recording(
+                config, puller, session, stem1, append=True, section="baseline1"
+            ) as writer:
+                if markers is not None:
+                    markers.push(33)
+                record_to_csv(puller, float(config.baseline_1), writer, marker=33)
 
             logging.info("Baseline 1 completed.")
 
         # ---------------------------- BASELINE 2 ----------------------------
-        vhpcom: SerialCommunicator = SerialCommunicator(config.serial_port)
-        wait_for_space("➡️  Place finger(s) 5 cm away from tactors (NO CONTACT)")
-
-        logging.info("Recording Baseline 2 (VHP ON, STIM ON, no contact)...")
-
-        vhpcom.set_channel(config.channel_start)
-        vhpcom.set_volume(config.volume_start)
-        vhpcom.set_frequency(config.frequency_start)
-        vhpcom.start_stream()
-
-        # Record baseline with marker 31
-        with open(fname2, "a", newline="") as f:
-            writer = csv.writer(f)
-            if fname2.stat().st_size == 0:
-                header: List[str] = ["Timestamp"] + [f"Ch{i+1}" for i in range(EEG_CHANNELS_COUNT)] + ["Label"]
-                writer.writerow(header)
-            record_to_csv(inlet, float(config.baseline_2), writer, marker=31)
-
-            vhpcom.stop_stream()
-            record_to_csv(inlet, float(config.baseline_2), writer, marker=33)
-
-        logging.info("Baseline 2 completed.")
+        vhpcom = SerialCommunicator(
+            config.serial_port,
+            markers,
+            config.serial_protocol,
+            config.ack_timeout,
+            config.ready_banner,
+            responses,
+        )
+        if config.resume:
+            logging.info(
+                f"Resuming sweep {config.timestamp}: {len(journal.completed)} units already "
+                "recorded, skipping baselines 1 and 2"
+            )
+        else:
+            wait_for_space("➡️  Place finger(s) 5 cm away from tactors (NO CONTACT)")
+
+            logging.info("Recording Baseline 2 (VHP ON, STIM ON, no contact)...")
+
+            vhpcom.set_parameters(
+                channel=config.channel_start,
+                volume=config.volume_start,
+                frequency=config.frequency_start,
+            )
+            sent_at: float = vhpcom.start_stream(marker=31)
+
+            # Record baseline with marker 31
+            with open_step_recording(
+                config,
+                puller,
+                session,
+                stem2,
+                append=True,
+                section="baseline2",
+                channel=config.channel_start,
+                frequency=config.frequency_start,
+                volume=config.volume_start,
+            ) as writer:
+                record_to_csv(
+                    puller,
+                    float(config.baseline_2),
+                    writer,
+                    marker=31,
+                    start_time=puller.to_stream_time(sent_at),
+                )
+
+                sent_at = vhpcom.stop_stream(marker=33)
+                record_to_csv(
+                    puller,
+                    float(config.baseline_2),
+                    writer,
+                    marker=33,
+                    start_time=puller.to_stream_time(sent_at),
+                )
+                writer.call_after_flush(
+                    lambda: journal.record_baselines(writer.path, writer.sink.sample_count)
+                )
+
+            logging.info("Baseline 2 completed.")
 
         # ---------------------------- SWEEP ----------------------------
         wait_for_space("➡️  Place finger(s) ON tactors (CONTACT) – Sweep starts...")
 
         vhpcom.set_test_mode(True)
 
-        num_ch: int = (config.channel_end - config.channel_start) // config.channel_steps + 1
-        num_freq: int = (
-            config.frequency_end - config.frequency_start
-        ) // config.frequency_steps + 1
-        num_vol: int = (config.volume_end - config.volume_start) // config.volume_steps + 1
-
-        global_total: int = num_ch * num_freq * num_vol * config.measurements_number
+        combinations: List[Tuple[int, int, int]] = [
+            (ch, freq, vol)
+            for ch in range(config.channel_start, config.channel_end + 1, config.channel_steps)
+            for freq in range(
+                config.frequency_start, config.frequency_end + 1, config.frequency_steps
+            )
+            for vol in range(config.volume_start, config.volume_end + 1, config.volume_steps)
+        ]
+        pending: Dict[Tuple[int, int, int], List[int]] = {
+            combination: journal.pending_cycles(*combination, config.measurements_number)
+            for combination in combinations
+        }
+
+        global_total: int = sum(len(cycles) for cycles in pending.values())
         global_counter: List[int] = [0]
         global_start_time: float = time.perf_counter()
+        scheduler: SweepScheduler = SweepScheduler(config, pending)
+        scheduler.start()
 
         logging.info(f"Total stim cycles in sweep: {global_total}")
 
-        for ch in range(
-            config.channel_start, config.channel_end + 1, config.channel_steps
-        ):
-            for freq in range(
-                config.frequency_start, config.frequency_end + 1, config.frequency_steps
-            ):
-                for vol in range(
-                    config.volume_start, config.volume_end + 1, config.volume_steps
-                ):
-                    vhpcom.set_channel(ch)
-                    vhpcom.set_volume(vol)
-                    vhpcom.set_frequency(freq)
-
-                    do_measurement(
-                        vhpcom,
-                        inlet,
-                        config,
-                        ch,
-                        freq,
-                        vol,
-                        global_counter,
-                        global_total,
-                        global_start_time,
-                    )
+        # Combinations already completed before --resume are left out
+        remaining: List[Tuple[Tuple[int, int, int], List[int]]] = [
+            (combination, cycles) for combination, cycles in pending.items() if cycles
+        ]
+        for index, ((ch, freq, vol), cycles) in enumerate(remaining):
+            if not (config.pipeline and index > 0):
+                vhpcom.set_parameters(channel=ch, volume=vol, frequency=freq)
+            # else: already sent during the previous combination's last OFF phase
+            next_combination: Optional[Tuple[int, int, int]] = None
+            if config.pipeline and index + 1 < len(remaining):
+                next_combination = remaining[index + 1][0]
+
+            do_measurement(
+                vhpcom,
+                puller,
+                config,
+                ch,
+                freq,
+                vol,
+                global_counter,
+                global_total,
+                global_start_time,
+                session,
+                journal,
+                cycles,
+                scheduler,
+                next_combination,
+            )
 
         logging.info("Sweep completed.")
-        write_metadata(args, config, fname1, fname2)
+        scheduler.report()
+        for line in vhpcom.parameter_summary():
+            logging.info(line)
+        write_metadata(
+            args,
+            config,
+            fname1,
+            fname2,
+            {
+                "Schedule": scheduler.summary(),
+                "Serial latency": vhpcom.latency_summary(),
+                "Parameter updates": vhpcom.parameter_summary(),
+                "Sample loss": puller.loss.summary(),
+                "Clock offset": puller.clock_summary(),
+                "Acquisition": puller.pull_summary(),
+            },
+        )
 
     except Exception as e:
         logging.error(f"Error during execution: {e}")
+    finally:
+        puller.stop()
+        if session is not None:
+            session.close()
+            session.report()
+        journal.close()
+        if puller.clock_offsets:
+            puller.write_clock_log(
+                recordings_dir / f"{config.timestamp}{CLOCK_LOG_SUFFIX}", append=config.resume
+            )
+        if vhpcom is not None:
+            vhpcom.close()
+            vhpcom.write_log(
+                recordings_dir / f"{config.timestamp}{VHP_LOG_SUFFIX}", append=config.resume
+            )
 
 
 if __name__ == "__main__":
-    import numpy as np
     np.random.seed(RANDOM_SEED)
     main()
-
-
-if __name__ == "__main__":
-    main()
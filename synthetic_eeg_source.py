@@ -0,0 +1,185 @@
+"""
+Synthetic LSL EEG source for testing the sweep without an amplifier
+
+Streams Gaussian noise plus a steady-state somatosensory evoked potential
+(SSSEP) on every channel. The SSSEP follows the VHP: its frequency and
+amplitude track the F and V commands and it is present only while
+stimulation is on (1/0). The VHP state is read from an LSL string stream of
+VHP responses such as "OK F34", which sweep_lsl.py publishes when
+VHP.ResponseStream is set in the device YAML. With --frequency the response
+is present from the start, with or without that stream.
+
+Samples are generated and pushed as NumPy chunks with timestamps derived
+from the nominal rate, so rates well above 20 kHz can be sustained.
+
+Usage: python synthetic_eeg_source.py [-r 2000] [-c 33] [--chunk 20] [--frequency 34]
+"""
+
+import argparse
+import logging
+import time
+from typing import Optional
+
+import numpy as np
+from pylsl import ContinuousResolver, StreamInfo, StreamInlet, StreamOutlet, local_clock
+
+from sweep_lsl import (
+    DEFAULT_STREAM_NAME,
+    EEG_CHANNELS_COUNT,
+    SERIAL_ACK_PREFIX,
+    SERIAL_REJECT_PREFIX,
+)
+
+DEFAULT_VHP_STREAM_NAME: str = "VHPResponses"
+REPORT_INTERVAL_SEC: float = 10.0
+
+
+class VhpStateFollower:
+    """Tracks the stimulation state of the VHP from its response stream."""
+
+    def __init__(self, stream_name: Optional[str], frequency: Optional[float]) -> None:
+        """
+        Starts looking for the response stream.
+
+        Args:
+            stream_name: LSL name of the VHP response stream, None to not follow the VHP.
+            frequency: Initial stimulation frequency; stimulation starts on if given.
+        """
+        self.frequency: float = frequency or 0.0
+        self.volume: float = 100.0
+        self.stimulating: bool = frequency is not None
+        self.inlet: Optional[StreamInlet] = None
+        self.resolver: Optional[ContinuousResolver] = (
+            ContinuousResolver(prop="name", value=stream_name) if stream_name else None
+        )
+
+    def update(self) -> None:
+        """Applies the responses received since the last call."""
+        if self.inlet is None:
+            if self.resolver is None:
+                return
+            results = self.resolver.results()
+            if not results:
+                return
+            self.inlet = StreamInlet(results[0])
+            logging.info(f"Following VHP responses on {results[0].name()}")
+
+        responses, _ = self.inlet.pull_chunk(timeout=0.0)
+        for (response,) in responses:
+            self.apply(response)
+
+    def apply(self, response: str) -> None:
+        """
+        Applies one VHP response line if it acknowledges a command.
+
+        Only "OK <command>" or a bare echo of the command counts; rejections
+        ("ERR <reason>: <command>") and other device messages leave the
+        state unchanged, as they do on the VHP.
+
+        Args:
+            response: The response line.
+        """
+        response = response.strip()
+        if response.startswith(SERIAL_ACK_PREFIX):
+            command: str = response[len(SERIAL_ACK_PREFIX) :].strip()
+        elif response and " " not in response and not response.startswith(SERIAL_REJECT_PREFIX):
+            command = response
+        else:
+            return
+        if command == "1":
+            self.stimulating = True
+        elif command == "0":
+            self.stimulating = False
+        elif command[:1] in ("F", "V") and command[1:].isdigit():
+            if command[0] == "F":
+                self.frequency = float(command[1:])
+            else:
+                self.volume = float(command[1:])
+
+    @property
+    def amplitude_scale(self) -> float:
+        """Fraction of the full SSSEP amplitude currently evoked."""
+        return self.volume / 100.0 if self.stimulating and self.frequency > 0 else 0.0
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(description="Synthetic LSL EEG source with SSSEP")
+    parser.add_argument("-n", "--name", default=DEFAULT_STREAM_NAME, help="LSL stream name")
+    parser.add_argument(
+        "-c", "--channels", type=int, default=EEG_CHANNELS_COUNT, help="Channel count"
+    )
+    parser.add_argument("-r", "--rate", type=float, default=2000.0, help="Sample rate in Hz")
+    parser.add_argument(
+        "--chunk", type=int, help="Samples per pushed chunk (default: 10 ms of data)"
+    )
+    parser.add_argument("--noise", type=float, default=10.0, help="Noise standard deviation in uV")
+    parser.add_argument(
+        "--amplitude", type=float, default=2.0, help="SSSEP amplitude in uV at volume 100"
+    )
+    parser.add_argument(
+        "--frequency", type=float, help="Stimulation frequency in Hz to evoke from the start"
+    )
+    parser.add_argument(
+        "--vhp-stream",
+        default=DEFAULT_VHP_STREAM_NAME,
+        help="LSL stream of VHP responses to follow ('' to disable)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
+
+    chunk: int = args.chunk or max(1, int(round(args.rate / 100)))
+    info = StreamInfo(
+        args.name, "EEG", args.channels, args.rate, "float32", f"synthetic_{args.name}"
+    )
+    outlet = StreamOutlet(info, chunk_size=chunk)
+    vhp = VhpStateFollower(args.vhp_stream or None, args.frequency)
+    logging.info(
+        f"Streaming {args.name}: {args.channels} channels at {args.rate:g} Hz, "
+        f"{chunk} samples per chunk"
+    )
+
+    # The SSSEP is strongest on the first channels and fades across the montage
+    weights: np.ndarray = np.linspace(1.0, 0.2, args.channels, dtype=np.float32)
+    rng: np.random.Generator = np.random.default_rng()
+    phase: float = 0.0
+    sent: int = 0
+    start: float = local_clock()
+    next_report: float = start + REPORT_INTERVAL_SEC
+
+    try:
+        while True:
+            due: int = int((local_clock() - start) * args.rate)
+            if due - sent < chunk:
+                time.sleep((sent + chunk - due) / args.rate)
+                continue
+
+            vhp.update()
+            n: int = due - sent
+            data: np.ndarray = rng.standard_normal((n, args.channels), dtype=np.float32)
+            data *= args.noise
+            scale: float = vhp.amplitude_scale
+            if scale > 0:
+                # Phase is carried across chunks so frequency changes stay continuous
+                steps: np.ndarray = phase + 2 * np.pi * vhp.frequency / args.rate * np.arange(1, n + 1)
+                data += (args.amplitude * scale * np.sin(steps)).astype(np.float32)[:, None] * weights
+                phase = float(steps[-1] % (2 * np.pi))
+
+            outlet.push_chunk(data, start + (due - 1) / args.rate)
+            sent = due
+
+            now: float = local_clock()
+            if now >= next_report:
+                lag_ms: float = (now - start - sent / args.rate) * 1000
+                logging.info(
+                    f"Sent {sent} samples ({sent / (now - start):,.0f} samples/s), "
+                    f"lag {lag_ms:.1f} ms, SSSEP "
+                    + (f"{vhp.frequency:g} Hz x{scale:.2f}" if scale > 0 else "off")
+                )
+                next_report = now + REPORT_INTERVAL_SEC
+    except KeyboardInterrupt:
+        logging.info(f"Stopped after {sent} samples")
+
+
+if __name__ == "__main__":
+    main()
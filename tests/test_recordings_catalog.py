@@ -0,0 +1,60 @@
+"""Tests for recordings_catalog.py"""
+
+import csv
+from pathlib import Path
+from typing import List, Tuple
+
+from recordings_catalog import RecordingsCatalog
+from sweep_lsl import SEGMENTS_HEADER, SEGMENTS_SUFFIX
+
+STEM: str = "261017-0130_STREAMING_BOARD_c1_f34_v80"
+SAMPLES: int = 100
+
+
+def write_recording(directory: Path) -> Path:
+    """Writes a legacy CSV recording with Rest/ON/OFF markers at samples 0, 40 and 70."""
+    path: Path = directory / f"{STEM}.csv"
+    labels = {0: "0", 40: "1", 70: "11"}
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Timestamp", "Ch1", "Label"])
+        for sample in range(SAMPLES):
+            writer.writerow([100 + sample / 1000, 0.0, labels.get(sample, "")])
+    return path
+
+
+def write_segments(directory: Path, on: Tuple[int, int]) -> None:
+    """Writes a segment index holding one ON phase over the sample range `on`."""
+    with open(directory / f"{STEM}{SEGMENTS_SUFFIX}", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SEGMENTS_HEADER)
+        writer.writerow(
+            ["sweep", "on", 1, 1, 34, 80, 1, on[0], on[1], 100 + on[0] / 1000, 100 + on[1] / 1000, 0]
+        )
+
+
+def on_phases(catalog: RecordingsCatalog, directory: Path) -> List[Tuple[int, int]]:
+    """Reindexes the directory and returns the (start, end) samples of the catalogued ON phases."""
+    catalog.update([directory], jobs=1)
+    return [(p["start_sample"], p["end_sample"]) for p in catalog.find_phases(phase="on")]
+
+
+def test_segment_index_changes_are_picked_up(tmp_path: Path) -> None:
+    write_recording(tmp_path)
+    catalog = RecordingsCatalog(tmp_path / "catalog.sqlite")
+    try:
+        assert on_phases(catalog, tmp_path) == [(40, 70)]  # From the Label column
+
+        write_segments(tmp_path, (45, 70))
+        assert on_phases(catalog, tmp_path) == [(45, 70)]
+
+        write_segments(tmp_path, (50, 65))  # Replaced, e.g. by resegment_recordings --force
+        assert on_phases(catalog, tmp_path) == [(50, 65)]
+
+        (tmp_path / f"{STEM}{SEGMENTS_SUFFIX}").unlink()
+        assert on_phases(catalog, tmp_path) == [(40, 70)]
+
+        counts = catalog.update([tmp_path], jobs=1)
+        assert counts["unchanged"] == 1
+    finally:
+        catalog.close()
@@ -0,0 +1,21 @@
+"""Tests for synthetic_eeg_source.py"""
+
+from synthetic_eeg_source import VhpStateFollower
+
+
+def test_follows_acknowledged_commands() -> None:
+    follower = VhpStateFollower(None, None)
+    for response in ("OK F34", "OK V50", "OK 1"):
+        follower.apply(response)
+    assert (follower.frequency, follower.volume, follower.stimulating) == (34.0, 50.0, True)
+    assert follower.amplitude_scale == 0.5
+    follower.apply("0")  # Bare echo without the ack protocol
+    assert not follower.stimulating
+
+
+def test_ignores_rejected_commands_and_device_messages() -> None:
+    follower = VhpStateFollower(None, 34.0)
+    follower.apply("OK V80")
+    for response in ("ERR out of range [0, 100]: V200", "ERR unknown command: 0", "Battery 10"):
+        follower.apply(response)
+    assert (follower.frequency, follower.volume, follower.stimulating) == (34.0, 80.0, True)
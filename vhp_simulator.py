@@ -0,0 +1,230 @@
+"""
+Emulates the VHP on a Linux pseudo-terminal
+
+Opens a pty and answers the command set used by SerialCommunicator
+(C/V/F/M/1/0/D/Y/P/Q/J) with "OK <command>" after a configurable latency and
+jitter, so the whole sweep can run, be profiled and be regression-tested
+without hardware. Until the first command arrives a readiness banner is
+repeated, standing in for the message the device prints after booting.
+
+The pty path is printed and, with -o, written into a copy of a device YAML:
+
+Usage: python vhp_simulator.py -o config/dev_vhp_sim.yaml [--latency 2] [--jitter 1]
+       python sweep_lsl.py -m config/sweep_dev.yaml -d config/dev_vhp_sim.yaml
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import pty
+import random
+import select
+import signal
+import time
+import tty
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+DEFAULT_BANNER: str = "VHP ready"
+BANNER_INTERVAL_SEC: float = 0.25
+
+# Accepted value range per parameter command (same limits as SerialCommunicator)
+PARAMETER_RANGES: Dict[str, Tuple[int, int]] = {
+    "C": (0, 8),  # Channel
+    "V": (0, 100),  # Volume
+    "F": (1, 65535),  # Frequency
+    "M": (0, 1),  # Test mode
+    "D": (1, 65535),  # Duration
+    "Y": (1, 65535),  # Cycle period
+    "P": (0, 100),  # Pause cycle period
+    "Q": (0, 100),  # Paused cycles
+    "J": (0, 1000),  # Jitter
+}
+STREAM_COMMANDS: Dict[str, bool] = {"1": True, "0": False}
+
+
+class VhpSimulator:
+    """Device state and command handling of the emulated VHP."""
+
+    def __init__(self) -> None:
+        """Starts with stimulation stopped and no parameters set."""
+        self.parameters: Dict[str, int] = {}
+        self.streaming: bool = False
+        self.counts: Counter = Counter()
+
+    def handle(self, command: str) -> str:
+        """
+        Applies one command.
+
+        Args:
+            command: The received line, without line terminator.
+
+        Returns:
+            The response line.
+        """
+        self.counts[command[:1]] += 1
+        if command in STREAM_COMMANDS:
+            self.streaming = STREAM_COMMANDS[command]
+            logging.debug(f"Stimulation {'ON' if self.streaming else 'OFF'}")
+            return f"OK {command}"
+
+        key: str = command[:1]
+        if key not in PARAMETER_RANGES:
+            return f"ERR unknown command: {command}"
+        try:
+            value: int = int(command[1:])
+        except ValueError:
+            return f"ERR invalid value: {command}"
+        low, high = PARAMETER_RANGES[key]
+        if not low <= value <= high:
+            return f"ERR out of range [{low}, {high}]: {command}"
+        self.parameters[key] = value
+        logging.debug(f"{key} = {value}")
+        return f"OK {command}"
+
+
+def open_pty() -> Tuple[int, str]:
+    """
+    Opens a raw pseudo-terminal.
+
+    Returns:
+        A tuple (master file descriptor, slave device path).
+    """
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+
+def write_device_config(template: Path, output: Path, port: str, banner: Optional[str]) -> None:
+    """
+    Writes a copy of a device YAML whose VHP section points at the simulator.
+
+    Args:
+        template: Device YAML to copy.
+        output: File to write.
+        port: The simulator's pty path.
+        banner: Readiness banner printed by the simulator, None if disabled.
+    """
+    with open(template, "r") as f:
+        device: Dict = yaml.safe_load(f)
+    device["VHP"]["Serial"] = port
+    device["VHP"]["ReadyBanner"] = banner
+    with open(output, "w") as f:
+        yaml.safe_dump(device, f, sort_keys=False)
+
+
+def serve(
+    master: int, simulator: VhpSimulator, latency: float, jitter: float, banner: Optional[str]
+) -> None:
+    """
+    Answers commands on the pty until interrupted.
+
+    Responses are queued with a delay of latency + a random jitter and are
+    sent in the order the commands arrived.
+
+    Args:
+        master: Master file descriptor of the pty.
+        simulator: Device state.
+        latency: Mean response latency in seconds.
+        jitter: Standard deviation of the latency in seconds.
+        banner: Readiness banner repeated until the first command, None to disable.
+    """
+    pending: List[Tuple[float, int, bytes]] = []  # (due time, sequence, response)
+    sequence: int = 0
+    last_due: float = 0.0
+    buffer: bytes = b""
+    next_banner: float = time.monotonic()
+    booted: bool = banner is None
+
+    while True:
+        now: float = time.monotonic()
+        if not booted and now >= next_banner:
+            os.write(master, f"{banner}\r\n".encode("utf-8"))
+            next_banner = now + BANNER_INTERVAL_SEC
+        while pending and pending[0][0] <= now:
+            _, _, response = heapq.heappop(pending)
+            os.write(master, response)
+
+        wake: float = next_banner if not booted else now + 1.0
+        if pending:
+            wake = min(wake, pending[0][0])
+        readable, _, _ = select.select([master], [], [], max(0.0, wake - time.monotonic()))
+        if not readable:
+            continue
+
+        buffer += os.read(master, 1024)
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            command: str = line.decode("utf-8", errors="ignore").strip()
+            if not command:
+                continue
+            booted = True
+            response: str = simulator.handle(command)
+            # Responses never overtake each other, as on a real serial link
+            due: float = max(
+                last_due, time.monotonic() + max(0.0, random.gauss(latency, jitter))
+            )
+            last_due = due
+            heapq.heappush(pending, (due, sequence, f"{response}\r\n".encode("utf-8")))
+            sequence += 1
+
+
+def main() -> None:
+    """Main execution entry point."""
+    parser = argparse.ArgumentParser(description="VHP emulator on a pseudo-terminal")
+    parser.add_argument(
+        "--latency", type=float, default=1.0, help="Mean response latency in ms"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.5, help="Standard deviation of the latency in ms"
+    )
+    parser.add_argument(
+        "--banner",
+        default=DEFAULT_BANNER,
+        help="Readiness banner repeated until the first command ('' to disable)",
+    )
+    parser.add_argument(
+        "-d",
+        "--deviceconf",
+        default="config/dev_lsl_stream.yaml",
+        help="Device YAML used as template for --output",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Write a device YAML with the pty path as VHP Serial"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log every command and state change"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="[%(asctime)s] %(message)s", level=logging.DEBUG if args.verbose else logging.INFO
+    )
+
+    banner: Optional[str] = args.banner or None
+    master, port = open_pty()
+    print(port, flush=True)
+    if args.output:
+        write_device_config(Path(args.deviceconf), Path(args.output), port, banner)
+        logging.info(f"Device configuration written to {args.output}")
+    logging.info(
+        f"VHP simulator on {port} (latency {args.latency} ms, jitter {args.jitter} ms)"
+    )
+
+    # Stop cleanly (with the summary) when terminated by a benchmark or CI job
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    simulator = VhpSimulator()
+    try:
+        serve(master, simulator, args.latency / 1000, args.jitter / 1000, banner)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        summary: str = ", ".join(f"{key}: {n}" for key, n in sorted(simulator.counts.items()))
+        logging.info(f"Commands received: {summary or 'none'}")
+
+
+if __name__ == "__main__":
+    main()